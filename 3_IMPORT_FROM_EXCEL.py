@@ -31,6 +31,8 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 import sys
 
+from excel_stream import ExcelRowSource
+
 # Load environment variables
 load_dotenv()
 
@@ -373,12 +375,12 @@ def get_or_create_user(company_name: str, email: str, full_name: str = None) ->
         print(f"  ✗ Error creating/getting user: {str(e)}")
         return None
 
-def map_row_to_db_columns(row: pd.Series, column_mapping: Dict[str, str], year: int) -> Dict[str, Any]:
+def map_row_to_db_columns(row: Dict[str, Any], column_mapping: Dict[str, str], year: int) -> Dict[str, Any]:
     """Map Excel row to database columns"""
     db_row = {}
     
     for excel_col, db_col in column_mapping.items():
-        if excel_col not in row.index:
+        if excel_col not in row:
             continue
         
         value = clean_value(row[excel_col])
@@ -426,10 +428,10 @@ def import_survey_year(year: int, excel_file: str) -> bool:
         return False
     
     try:
-        # Read Excel file
+        # Stream the Excel file row by row instead of loading the whole sheet
         print(f"Reading Excel file: {excel_file}")
-        df = pd.read_excel(excel_file)
-        print(f"✓ Found {len(df)} rows in Excel file")
+        source = ExcelRowSource(excel_file)
+        print(f"✓ Found {len(source.columns)} columns (~{source.rows_hint or '?'} rows) in Excel file")
         
         # Get column mapping for this year
         column_mapping = COLUMN_MAPPINGS[year]
@@ -438,9 +440,9 @@ def import_survey_year(year: int, excel_file: str) -> bool:
         success_count = 0
         error_count = 0
         
-        for idx, row in df.iterrows():
+        for idx, row in source:
             try:
-                print(f"\nProcessing row {idx + 1}/{len(df)}...")
+                print(f"\nProcessing row {idx + 1}/~{source.rows_hint or '?'}...")
                 
                 # Extract company name and email
                 company_name = clean_value(row.get('Firm Name') or row.get('1. Name of firm'))
@@ -0,0 +1,23 @@
+-- =====================================================
+-- EXEC_SQL RPC FOR MIGRATION BATCHES
+-- Lets execute_migration_supabase.py --backend rpc run each
+-- migration batch through PostgREST (/rest/v1/rpc/exec_sql).
+-- Only the service role may call it. Drop it once the
+-- migration is done:
+--   DROP FUNCTION IF EXISTS public.exec_sql(text);
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.exec_sql(sql TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    EXECUTE sql;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.exec_sql(TEXT) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.exec_sql(TEXT) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.exec_sql(TEXT) TO service_role;
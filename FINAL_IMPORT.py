@@ -12,17 +12,63 @@ import pandas as pd
 import json
 import os
 import sys
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional, Set, Tuple
 from datetime import datetime
+from collections import defaultdict
+import itertools
 import re
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import traceback
 
+from user_provisioning import UserProvisioner, STATUS_CREATED
+from excel_cache import read_excel_cached, excel_columns, iter_cached_chunks
+from excel_stream import ExcelRowSource
+
 # Load environment variables
 load_dotenv()
 
 class CompleteSurveyImporter:
+    # Page size for the profiles pre-flight (PostgREST caps responses at 1000 rows)
+    PROFILE_PAGE_SIZE = 1000
+    
+    # Email / name / role columns per survey year, used by the pre-flight pass
+    EMAIL_COLUMNS = {
+        '2021': 'Email Address',
+        '2022': 'Email address',
+        '2023': 'Email address',
+        '2024': "Email address (note: all responses are anonymized. We have learned through the years that many respondents' answers trigger interesting follow-on discussions, which we use to improve the survey and CFF's overall understanding of the small business finance marketplace)"
+    }
+    NAME_COLUMNS = {
+        '2021': ('2. Name of participant', '3. Role / title of participant'),
+        '2022': ('Name', 'Role or title')
+    }
+    
+    # Multi-select columns normalized into child tables:
+    # year -> [(Excel column, child table, value column)]
+    MULTISELECT_FIELDS = {
+        '2021': [
+            ('4. Where is your team based?', 'survey_2021_team_based', 'team_based'),
+            ('5. What is the geographic focus of your fund/vehicle?', 'survey_2021_geographic_focus', 'geographic_focus'),
+        ],
+        '2022': [
+            ('Where is your Team based?  (select as many as applicable)', 'survey_2022_team_based', 'team_based'),
+            ('In what geographic markets do you operate?  (select as many as applicable)', 'survey_2022_geographic_markets', 'geographic_markets'),
+        ],
+        '2023': [
+            ('Where is your Team based?  (select as many as applicable)', 'survey_2023_team_based', 'team_based'),
+            ('In what geographic markets do you invest?  (select as many as applicable)', 'survey_2023_geographic_markets', 'geographic_markets'),
+        ],
+        '2024': [
+            ('Where is your Team based? (Please select as many as apply)', 'survey_2024_team_based', 'team_based'),
+            ('In what geographic markets do you invest? (Please select as many as apply)', 'survey_2024_geographic_markets', 'geographic_markets'),
+            ('Please check all investment networks or associations that you are a part of. If they are not listed, please include them in the textbox.', 'survey_2024_investment_networks', 'investment_networks'),
+        ],
+    }
+    
+    # Child rows per bulk insert request
+    CHILD_BATCH_SIZE = 500
+
     def __init__(self):
         """Initialize Supabase client"""
         self.supabase_url = os.getenv('SUPABASE_URL')
@@ -32,18 +78,29 @@ class CompleteSurveyImporter:
             raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in .env file")
         
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        self.provisioner = UserProvisioner(self.supabase_url, self.supabase_key)
         
         # Default password for all created users
         self.default_password = os.getenv('DEFAULT_PASSWORD', '@ESCPNetwork2025#')
         
+        # Rows per survey_20XX_responses upsert request
+        self.batch_size = int(os.getenv('IMPORT_BATCH_SIZE', '100'))
+        
         # Statistics
         self.stats = {
             'users_created': 0,
             'users_existing': 0,
             'surveys_imported': 0,
             'surveys_skipped': 0,
+            'multiselect_rows': 0,
             'errors': []
         }
+        
+        # child table -> [(row label, payload)], written in bulk by load_multiselect()
+        self.child_rows: Dict[str, List[tuple]] = defaultdict(list)
+        
+        # email -> user_id, filled once by load_user_index()
+        self.user_index: Dict[str, str] = {}
     
     def clean_email(self, email: Any) -> Optional[str]:
         """Clean and validate email address"""
@@ -56,62 +113,196 @@ class CompleteSurveyImporter:
             return email_str
         return None
     
+    def is_subheader(self, year: str, row: Dict[str, Any]) -> bool:
+        """True for the 'Open-Ended Response' sub-header row under the question headers"""
+        if year == '2022':
+            return row.get('Name') == 'Open-Ended Response'
+        if year == '2023':
+            return row.get('Email address') == 'Open-Ended Response'
+        if year == '2024':
+            return 'Open-Ended Response' in str(list(row.values()))
+        return False
+    
+    def read_survey(self, year: str, file_path: str) -> Tuple[List[Any], Iterator[Tuple[int, Dict[str, Any]]]]:
+        """
+        Stream a survey workbook as (columns, (idx, row) pairs), dropping the
+        'Open-Ended Response' sub-header row. Rows come from the Parquet sidecar
+        written by the pre-flight, one row group at a time, or else straight
+        from the xlsx; either way only a chunk of rows is held in memory and
+        the first row is handed out before the rest of the sheet is read.
+        """
+        chunks = iter_cached_chunks(file_path, chunk_size=self.batch_size)
+        if chunks is not None:
+            columns = excel_columns(file_path)
+        else:
+            source = ExcelRowSource(file_path, chunk_size=self.batch_size)
+            chunks = source.iter_chunks()
+            # Reading the first chunk also reads the header row
+            first = next(chunks, [])
+            columns = source.columns
+            chunks = itertools.chain([first], chunks)
+        
+        def rows():
+            offset = 0
+            position = 0
+            for chunk in chunks:
+                for row in chunk:
+                    if position == 0 and self.is_subheader(year, row):
+                        offset = 1
+                    else:
+                        yield position - offset, row
+                    position += 1
+        
+        return columns, rows()
+    
+    def load_user_index(self):
+        """Load every existing profile once into the email -> user_id index"""
+        print("Loading existing profiles...")
+        start = 0
+        while True:
+            # Ordered so pages do not overlap or skip rows; the server's max-rows cap
+            # may return fewer rows than asked, so advance by what came back until empty
+            response = self.supabase.table('profiles')\
+                .select('id, email')\
+                .order('id')\
+                .range(start, start + self.PROFILE_PAGE_SIZE - 1)\
+                .execute()
+            rows = response.data or []
+            if not rows:
+                break
+            for profile in rows:
+                email = (profile.get('email') or '').strip().lower()
+                if email:
+                    self.user_index[email] = profile['id']
+            start += len(rows)
+        print(f"✓ Indexed {len(self.user_index)} existing profiles")
+    
+    def collect_survey_users(self, files: Dict[str, str]) -> Dict[str, tuple]:
+        """Collect distinct emails across all workbooks as email -> (name, role)"""
+        users: Dict[str, tuple] = {}
+        for year, file_path in files.items():
+            email_col = self.EMAIL_COLUMNS[year]
+            name_col, role_col = self.NAME_COLUMNS.get(year, (None, None))
+            wanted = [col for col in (email_col, name_col, role_col) if col]
+            # The one full parse of the workbook this run: it writes the sidecar
+            # that read_survey() then streams during the import
+            df = read_excel_cached(file_path, columns=wanted)
+            if email_col not in df.columns:
+                continue
+            df = df.astype(object)
+            for row in df.where(df.notna(), None).to_dict('records'):
+                email = self.clean_email(row.get(email_col))
+                if not email:
+                    continue
+                name = self.clean_value(row.get(name_col)) if name_col else ''
+                role = self.clean_value(row.get(role_col)) if role_col else ''
+                # Keep the first occurrence that actually carries a name
+                if email not in users or (name and not users[email][0]):
+                    users[email] = (name, role)
+        return users
+    
+    def prepare_users(self, files: Dict[str, str]):
+        """Pre-flight: index existing users and create only the missing ones"""
+        print(f"\n{'='*80}")
+        print("PRE-FLIGHT: RESOLVING USERS")
+        print(f"{'='*80}\n")
+        
+        self.load_user_index()
+        survey_users = self.collect_survey_users(files)
+        missing = {email: info for email, info in survey_users.items() if email not in self.user_index}
+        self.stats['users_existing'] = len(survey_users) - len(missing)
+        
+        print(f"Distinct survey emails: {len(survey_users)}")
+        print(f"Already registered:     {self.stats['users_existing']}")
+        print(f"To be created:          {len(missing)}\n")
+        
+        self.create_users(missing)
+    
     def get_or_create_user(self, email: str, name: str = "", role_title: str = "") -> Optional[str]:
-        """Get existing user or create new one with default password"""
-        try:
-            # Check if user exists in profiles table
-            response = self.supabase.table('profiles').select('id').eq('email', email).execute()
-            
-            if response.data and len(response.data) > 0:
-                self.stats['users_existing'] += 1
-                return response.data[0]['id']
-            
-            # User doesn't exist, create new one
-            name_parts = name.strip().split(' ', 1) if name else ['', '']
-            first_name = name_parts[0] if name_parts else ''
-            last_name = name_parts[1] if len(name_parts) > 1 else ''
-            
-            # Create user with Supabase Admin API
-            print(f"  Creating user: {email} with password: {self.default_password}")
-            new_user = self.supabase.auth.admin.create_user({
+        """Resolve a user from the pre-flight index, creating it only if it is still missing"""
+        user_id = self.user_index.get(email)
+        if user_id:
+            return user_id
+        self.create_users({email: (name, role_title)})
+        return self.user_index.get(email)
+    
+    def split_name(self, name: str) -> Tuple[str, str]:
+        """Split a participant name into first and last name"""
+        name_parts = name.strip().split(' ', 1) if name else ['', '']
+        first_name = name_parts[0] if name_parts else ''
+        last_name = name_parts[1] if len(name_parts) > 1 else ''
+        return first_name, last_name
+    
+    def create_users(self, users: Dict[str, tuple]):
+        """Create auth users (email -> (name, role)) on the provisioning pool, then their profiles and roles"""
+        if not users:
+            return
+        
+        new_users = []
+        for email, (name, role_title) in users.items():
+            first_name, last_name = self.split_name(name)
+            new_users.append({
                 'email': email,
                 'password': self.default_password,
-                'email_confirm': True,
                 'user_metadata': {
                     'first_name': first_name,
                     'last_name': last_name,
                     'role_title': role_title
                 }
             })
-            
-            if new_user and hasattr(new_user, 'user'):
-                user_id = new_user.user.id
+        
+        print(f"  Creating {len(new_users)} users with password: {self.default_password}")
+        results = self.provisioner.provision(new_users)
+        
+        profiles = []
+        for user in new_users:
+            email = user['email']
+            result = results[email]
+            if result['status'] == STATUS_CREATED:
                 self.stats['users_created'] += 1
                 print(f"✓ Created user: {email}")
-                
-                # Create profile
-                self.supabase.table('profiles').insert({
-                    'id': user_id,
-                    'email': email,
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'role_title': role_title
-                }).execute()
-                
-                # Create user role
-                self.supabase.table('user_roles').insert({
-                    'user_id': user_id,
-                    'email': email,
-                    'role': 'member'
-                }).execute()
-                
-                return user_id
-            
-        except Exception as e:
-            error_msg = f"Error with user {email}: {str(e)}"
-            print(f"✗ {error_msg}")
-            self.stats['errors'].append(error_msg)
-            return None
+                profiles.append({'id': result['user_id'], 'email': email, **user['user_metadata']})
+            else:
+                reason = result['error'] or 'already registered in auth but has no profile'
+                error_msg = f"Error with user {email}: {reason}"
+                print(f"✗ {error_msg}")
+                self.stats['errors'].append(error_msg)
+        
+        # One request for all new profiles; only users whose profile was written get indexed
+        profiles = self.write_user_rows('profiles', profiles)
+        for profile in profiles:
+            self.user_index[profile['email']] = profile['id']
+        
+        # The handle_new_user trigger already gave each new auth user a user_roles row, so upsert over it
+        roles = [{'user_id': profile['id'], 'email': profile['email'], 'role': 'member'} for profile in profiles]
+        self.write_user_rows('user_roles', roles, on_conflict='user_id')
+    
+    def write_user_rows(self, table: str, rows: List[Dict[str, Any]],
+                        on_conflict: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Write rows in one request, retrying row by row if it fails; returns the rows written"""
+        if not rows:
+            return []
+        
+        def write(payload):
+            query = self.supabase.table(table)
+            query = query.upsert(payload, on_conflict=on_conflict) if on_conflict else query.insert(payload)
+            query.execute()
+        
+        try:
+            write(rows)
+            return rows
+        except Exception:
+            # Retry the failed batch row by row so one bad row does not lose the rest
+            written = []
+            for row in rows:
+                try:
+                    write(row)
+                    written.append(row)
+                except Exception as e:
+                    error_msg = f"Error writing {table} row for {row['email']}: {str(e)}"
+                    print(f"✗ {error_msg}")
+                    self.stats['errors'].append(error_msg)
+            return written
     
     def clean_value(self, value: Any) -> str:
         """Clean text value"""
@@ -119,6 +310,68 @@ class CompleteSurveyImporter:
             return ''
         return str(value).strip()
     
+    def insert_responses_batch(self, table: str, payloads: List[Dict[str, Any]]) -> Tuple[List[Optional[str]], Set[int]]:
+        """
+        Insert survey responses in chunks of batch_size with one upsert per chunk.
+        
+        Uses ON CONFLICT (user_id) DO NOTHING, so users that already have a
+        response are skipped without a separate existence check. Returns the
+        new response ids aligned with payloads (None where nothing was inserted).
+        Requires the user_id unique constraint from add_survey_user_id_unique.sql.
+        """
+        ids: List[Optional[str]] = [None] * len(payloads)
+        failed: Set[int] = set()
+        positions: Dict[str, int] = {}
+        queued: List[int] = []
+        for i, payload in enumerate(payloads):
+            # Only the first response per user is inserted, as with the old existence check
+            if payload['user_id'] not in positions:
+                positions[payload['user_id']] = i
+                queued.append(i)
+        
+        for start in range(0, len(queued), self.batch_size):
+            chunk_positions = queued[start:start + self.batch_size]
+            chunk = [payloads[i] for i in chunk_positions]
+            try:
+                result = self.supabase.table(table)\
+                    .upsert(chunk, on_conflict='user_id', ignore_duplicates=True)\
+                    .execute()
+            except Exception as e:
+                error_msg = f"{table} rows {start + 1}-{start + len(chunk)}: {str(e)}"
+                print(f"✗ {error_msg}")
+                self.stats['errors'].append(error_msg)
+                failed.update(chunk_positions)
+                continue
+            
+            for record in result.data or []:
+                position = positions.get(record.get('user_id'))
+                if position is not None:
+                    ids[position] = record['id']
+        
+        return ids, failed
+    
+    def flush_responses(self, year: str, pending: List[tuple]):
+        """Write queued (idx, email, row, survey_data) responses and link their multi-select rows"""
+        if not pending:
+            return
+        
+        print(f"Inserting {len(pending)} responses in batches of {self.batch_size}...")
+        response_ids, failed = self.insert_responses_batch(
+            f'survey_{year}_responses',
+            [survey_data for _, _, _, survey_data in pending]
+        )
+        
+        for position, ((idx, email, row, _), response_id) in enumerate(zip(pending, response_ids)):
+            if position in failed:
+                self.stats['surveys_skipped'] += 1
+            elif response_id:
+                self.collect_multiselect(year, response_id, row, f"{year} row {idx+1}")
+                print(f"✓ Row {idx+1}: Imported survey for {email}")
+                self.stats['surveys_imported'] += 1
+            else:
+                print(f"Row {idx+1}: Skipping - already exists for {email}")
+                self.stats['surveys_skipped'] += 1
+    
     def import_2021_survey(self, file_path: str):
         """Import 2021 survey data"""
         print(f"\n{'='*80}")
@@ -126,10 +379,17 @@ class CompleteSurveyImporter:
         print(f"{'='*80}\n")
         
         try:
-            df = pd.read_excel(file_path)
-            print(f"Found {len(df)} rows")
+            columns, rows = self.read_survey('2021', file_path)
+            print("Streaming rows...")
             
-            for idx, row in df.iterrows():
+            pending = []
+            rows_seen = 0
+            for idx, row in rows:
+                rows_seen += 1
+                # Write each full batch as soon as it is queued, so memory stays flat
+                if len(pending) >= self.batch_size:
+                    self.flush_responses('2021', pending)
+                    pending = []
                 try:
                     email = self.clean_email(row.get('Email Address'))
                     if not email:
@@ -145,26 +405,15 @@ class CompleteSurveyImporter:
                         self.stats['surveys_skipped'] += 1
                         continue
                     
-                    # Check if survey already exists
-                    existing = self.supabase.table('survey_2021_responses')\
-                        .select('id')\
-                        .eq('user_id', user_id)\
-                        .execute()
-                    
-                    if existing.data:
-                        print(f"Row {idx+1}: Skipping - already exists for {email}")
-                        self.stats['surveys_skipped'] += 1
-                        continue
-                    
                     # Build form_data JSONB with ALL survey fields
                     form_data = {}
-                    for col in df.columns:
+                    for col in columns:
                         if col not in ['Timestamp', 'Email Address']:
                             val = row.get(col)
                             if not pd.isna(val) and val != '':
                                 form_data[col] = str(val)
                     
-                    # Insert main survey response
+                    # Queue main survey response for the batched insert
                     survey_data = {
                         'user_id': user_id,
                         'email_address': email,
@@ -177,58 +426,20 @@ class CompleteSurveyImporter:
                         'completed_at': datetime.now().isoformat()
                     }
                     
-                    result = self.supabase.table('survey_2021_responses').insert(survey_data).execute()
-                    response_id = result.data[0]['id'] if result.data else None
-                    
-                    if response_id:
-                        # Insert multi-select data into separate tables
-                        self._insert_2021_multiselect(response_id, row)
-                        print(f"✓ Row {idx+1}: Imported survey for {email}")
-                        self.stats['surveys_imported'] += 1
+                    pending.append((idx, email, row, survey_data))
                     
                 except Exception as e:
                     error_msg = f"Row {idx+1}: {str(e)}"
                     print(f"✗ {error_msg}")
                     self.stats['errors'].append(error_msg)
+            
+            self.flush_responses('2021', pending)
+            print(f"Processed {rows_seen} rows")
         
         except Exception as e:
             print(f"✗ Failed to import 2021 survey: {str(e)}")
             traceback.print_exc()
     
-    def _insert_2021_multiselect(self, response_id: str, row: pd.Series):
-        """Insert 2021 multi-select responses into separate tables"""
-        try:
-            # Team based
-            team_based = self.clean_value(row.get('4. Where is your team based?'))
-            if team_based:
-                for item in team_based.split(','):
-                    item = item.strip()
-                    if item:
-                        try:
-                            self.supabase.table('survey_2021_team_based').insert({
-                                'response_id': response_id,
-                                'team_based': item
-                            }).execute()
-                        except:
-                            pass
-            
-            # Geographic focus
-            geo_focus = self.clean_value(row.get('5. What is the geographic focus of your fund/vehicle?'))
-            if geo_focus:
-                for item in geo_focus.split(','):
-                    item = item.strip()
-                    if item:
-                        try:
-                            self.supabase.table('survey_2021_geographic_focus').insert({
-                                'response_id': response_id,
-                                'geographic_focus': item
-                            }).execute()
-                        except:
-                            pass
-            
-        except Exception as e:
-            print(f"  Warning: Could not insert multi-select data: {str(e)}")
-    
     def import_2022_survey(self, file_path: str):
         """Import 2022 survey data"""
         print(f"\n{'='*80}")
@@ -236,14 +447,17 @@ class CompleteSurveyImporter:
         print(f"{'='*80}\n")
         
         try:
-            df = pd.read_excel(file_path)
-            # Skip header row if present
-            if df.iloc[0]['Name'] == 'Open-Ended Response':
-                df = df.iloc[1:].reset_index(drop=True)
-            
-            print(f"Found {len(df)} rows")
+            columns, rows = self.read_survey('2022', file_path)
+            print("Streaming rows...")
             
-            for idx, row in df.iterrows():
+            pending = []
+            rows_seen = 0
+            for idx, row in rows:
+                rows_seen += 1
+                # Write each full batch as soon as it is queued, so memory stays flat
+                if len(pending) >= self.batch_size:
+                    self.flush_responses('2022', pending)
+                    pending = []
                 try:
                     email = self.clean_email(row.get('Email address'))
                     if not email:
@@ -258,19 +472,9 @@ class CompleteSurveyImporter:
                         self.stats['surveys_skipped'] += 1
                         continue
                     
-                    existing = self.supabase.table('survey_2022_responses')\
-                        .select('id')\
-                        .eq('user_id', user_id)\
-                        .execute()
-                    
-                    if existing.data:
-                        print(f"Row {idx+1}: Skipping - already exists for {email}")
-                        self.stats['surveys_skipped'] += 1
-                        continue
-                    
                     # Build form_data
                     form_data = {}
-                    for col in df.columns:
+                    for col in columns:
                         if col not in ['...1', 'Email address']:
                             val = row.get(col)
                             if not pd.isna(val) and val != '':
@@ -288,28 +492,20 @@ class CompleteSurveyImporter:
                         'completed_at': datetime.now().isoformat()
                     }
                     
-                    result = self.supabase.table('survey_2022_responses').insert(survey_data).execute()
-                    response_id = result.data[0]['id'] if result.data else None
-                    
-                    if response_id:
-                        self._insert_2022_multiselect(response_id, row)
-                        print(f"✓ Row {idx+1}: Imported survey for {email}")
-                        self.stats['surveys_imported'] += 1
+                    pending.append((idx, email, row, survey_data))
                     
                 except Exception as e:
                     error_msg = f"Row {idx+1}: {str(e)}"
                     print(f"✗ {error_msg}")
                     self.stats['errors'].append(error_msg)
+            
+            self.flush_responses('2022', pending)
+            print(f"Processed {rows_seen} rows")
         
         except Exception as e:
             print(f"✗ Failed to import 2022 survey: {str(e)}")
             traceback.print_exc()
     
-    def _insert_2022_multiselect(self, response_id: str, row: pd.Series):
-        """Insert 2022 multi-select responses"""
-        # Similar to 2021, insert into survey_2022_team_based, survey_2022_geographic_markets, etc.
-        pass
-    
     def import_2023_survey(self, file_path: str):
         """Import 2023 survey data"""
         print(f"\n{'='*80}")
@@ -317,13 +513,17 @@ class CompleteSurveyImporter:
         print(f"{'='*80}\n")
         
         try:
-            df = pd.read_excel(file_path)
-            if df.iloc[0]['Email address'] == 'Open-Ended Response':
-                df = df.iloc[1:].reset_index(drop=True)
-            
-            print(f"Found {len(df)} rows")
+            columns, rows = self.read_survey('2023', file_path)
+            print("Streaming rows...")
             
-            for idx, row in df.iterrows():
+            pending = []
+            rows_seen = 0
+            for idx, row in rows:
+                rows_seen += 1
+                # Write each full batch as soon as it is queued, so memory stays flat
+                if len(pending) >= self.batch_size:
+                    self.flush_responses('2023', pending)
+                    pending = []
                 try:
                     email = self.clean_email(row.get('Email address'))
                     if not email:
@@ -335,19 +535,9 @@ class CompleteSurveyImporter:
                         self.stats['surveys_skipped'] += 1
                         continue
                     
-                    existing = self.supabase.table('survey_2023_responses')\
-                        .select('id')\
-                        .eq('user_id', user_id)\
-                        .execute()
-                    
-                    if existing.data:
-                        print(f"Row {idx+1}: Skipping - already exists for {email}")
-                        self.stats['surveys_skipped'] += 1
-                        continue
-                    
                     # Build form_data
                     form_data = {}
-                    for col in df.columns:
+                    for col in columns:
                         if col not in ['...1', 'Email address']:
                             val = row.get(col)
                             if not pd.isna(val) and val != '':
@@ -364,27 +554,20 @@ class CompleteSurveyImporter:
                         'completed_at': datetime.now().isoformat()
                     }
                     
-                    result = self.supabase.table('survey_2023_responses').insert(survey_data).execute()
-                    response_id = result.data[0]['id'] if result.data else None
-                    
-                    if response_id:
-                        self._insert_2023_multiselect(response_id, row)
-                        print(f"✓ Row {idx+1}: Imported survey for {email}")
-                        self.stats['surveys_imported'] += 1
+                    pending.append((idx, email, row, survey_data))
                     
                 except Exception as e:
                     error_msg = f"Row {idx+1}: {str(e)}"
                     print(f"✗ {error_msg}")
                     self.stats['errors'].append(error_msg)
+            
+            self.flush_responses('2023', pending)
+            print(f"Processed {rows_seen} rows")
         
         except Exception as e:
             print(f"✗ Failed to import 2023 survey: {str(e)}")
             traceback.print_exc()
     
-    def _insert_2023_multiselect(self, response_id: str, row: pd.Series):
-        """Insert 2023 multi-select responses"""
-        pass
-    
     def import_2024_survey(self, file_path: str):
         """Import 2024 survey data"""
         print(f"\n{'='*80}")
@@ -392,15 +575,19 @@ class CompleteSurveyImporter:
         print(f"{'='*80}\n")
         
         try:
-            df = pd.read_excel(file_path)
-            if 'Open-Ended Response' in str(df.iloc[0].values):
-                df = df.iloc[1:].reset_index(drop=True)
-            
-            print(f"Found {len(df)} rows")
+            columns, rows = self.read_survey('2024', file_path)
+            print("Streaming rows...")
             
-            for idx, row in df.iterrows():
+            pending = []
+            rows_seen = 0
+            for idx, row in rows:
+                rows_seen += 1
+                # Write each full batch as soon as it is queued, so memory stays flat
+                if len(pending) >= self.batch_size:
+                    self.flush_responses('2024', pending)
+                    pending = []
                 try:
-                    email_col = "Email address (note: all responses are anonymized. We have learned through the years that many respondents' answers trigger interesting follow-on discussions, which we use to improve the survey and CFF's overall understanding of the small business finance marketplace)"
+                    email_col = self.EMAIL_COLUMNS['2024']
                     email = self.clean_email(row.get(email_col))
                     
                     if not email:
@@ -412,19 +599,9 @@ class CompleteSurveyImporter:
                         self.stats['surveys_skipped'] += 1
                         continue
                     
-                    existing = self.supabase.table('survey_2024_responses')\
-                        .select('id')\
-                        .eq('user_id', user_id)\
-                        .execute()
-                    
-                    if existing.data:
-                        print(f"Row {idx+1}: Skipping - already exists for {email}")
-                        self.stats['surveys_skipped'] += 1
-                        continue
-                    
                     # Build form_data
                     form_data = {}
-                    for col in df.columns:
+                    for col in columns:
                         if col not in ['...1', email_col]:
                             val = row.get(col)
                             if not pd.isna(val) and val != '':
@@ -441,26 +618,65 @@ class CompleteSurveyImporter:
                         'completed_at': datetime.now().isoformat()
                     }
                     
-                    result = self.supabase.table('survey_2024_responses').insert(survey_data).execute()
-                    response_id = result.data[0]['id'] if result.data else None
-                    
-                    if response_id:
-                        self._insert_2024_multiselect(response_id, row)
-                        print(f"✓ Row {idx+1}: Imported survey for {email}")
-                        self.stats['surveys_imported'] += 1
+                    pending.append((idx, email, row, survey_data))
                     
                 except Exception as e:
                     error_msg = f"Row {idx+1}: {str(e)}"
                     print(f"✗ {error_msg}")
                     self.stats['errors'].append(error_msg)
+            
+            self.flush_responses('2024', pending)
+            print(f"Processed {rows_seen} rows")
         
         except Exception as e:
             print(f"✗ Failed to import 2024 survey: {str(e)}")
             traceback.print_exc()
     
-    def _insert_2024_multiselect(self, response_id: str, row: pd.Series):
-        """Insert 2024 multi-select responses"""
-        pass
+    def collect_multiselect(self, year: str, response_id: str, row: Dict[str, Any], label: str):
+        """Queue the (response_id, value) child rows of one response for load_multiselect()"""
+        for excel_col, table, value_col in self.MULTISELECT_FIELDS[year]:
+            value = self.clean_value(row.get(excel_col))
+            if not value:
+                continue
+            for item in value.split(','):
+                item = item.strip()
+                if item:
+                    self.child_rows[table].append((label, {
+                        'response_id': response_id,
+                        value_col: item
+                    }))
+    
+    def load_multiselect(self):
+        """Bulk insert every queued multi-select row, a few requests per child table"""
+        if not self.child_rows:
+            return
+        
+        print(f"\n{'='*80}")
+        print("LOADING MULTI-SELECT TABLES")
+        print(f"{'='*80}\n")
+        
+        for table, rows in self.child_rows.items():
+            inserted = 0
+            for start in range(0, len(rows), self.CHILD_BATCH_SIZE):
+                chunk = rows[start:start + self.CHILD_BATCH_SIZE]
+                try:
+                    self.supabase.table(table).insert([payload for _, payload in chunk]).execute()
+                    inserted += len(chunk)
+                except Exception:
+                    # Retry the failed chunk row by row so each bad row is reported
+                    for label, payload in chunk:
+                        try:
+                            self.supabase.table(table).insert(payload).execute()
+                            inserted += 1
+                        except Exception as e:
+                            error_msg = f"{label}: {table} value {payload!r} failed: {str(e)}"
+                            print(f"✗ {error_msg}")
+                            self.stats['errors'].append(error_msg)
+            
+            self.stats['multiselect_rows'] += inserted
+            print(f"✓ {table}: {inserted}/{len(rows)} rows")
+        
+        self.child_rows.clear()
     
     def print_summary(self):
         """Print import summary"""
@@ -471,6 +687,7 @@ class CompleteSurveyImporter:
         print(f"Users existing:       {self.stats['users_existing']}")
         print(f"Surveys imported:     {self.stats['surveys_imported']}")
         print(f"Surveys skipped:      {self.stats['surveys_skipped']}")
+        print(f"Multi-select rows:    {self.stats['multiselect_rows']}")
         print(f"Errors:               {len(self.stats['errors'])}")
         print(f"\nDefault password:     {self.default_password}")
         
@@ -518,10 +735,12 @@ def main():
     
     # Import each survey
     try:
+        importer.prepare_users(files)
         importer.import_2021_survey(files['2021'])
         importer.import_2022_survey(files['2022'])
         importer.import_2023_survey(files['2023'])
         importer.import_2024_survey(files['2024'])
+        importer.load_multiselect()
     except KeyboardInterrupt:
         print("\n\n✗ Import cancelled by user")
     except Exception as e:
@@ -16,6 +16,8 @@ from dotenv import load_dotenv
 import sys
 from datetime import datetime
 
+from auth_directory import AuthUserDirectory
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv('SUPABASE_URL')
@@ -45,11 +47,7 @@ def parse_boolean(value):
 def get_user_by_email(email: str):
     """Get existing user ID by email"""
     try:
-        users_response = supabase.auth.admin.list_users()
-        for user in users_response:
-            if user.email == email:
-                return user.id
-        return None
+        return AuthUserDirectory.for_client(supabase).get(email)
     except Exception as e:
         print(f"  ✗ Error fetching user: {e}")
         return None
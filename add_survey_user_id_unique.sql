@@ -0,0 +1,81 @@
+-- ============================================================================
+-- UNIQUE user_id ON survey_20XX_responses
+-- Required by FINAL_IMPORT.py, which upserts responses in batches with
+-- ON CONFLICT (user_id) DO NOTHING instead of checking each row first.
+-- Run in the Supabase SQL Editor before the import. Safe to run again:
+-- constraints that already exist are left alone.
+-- ============================================================================
+
+-- ----------------------------------------------------------------------------
+-- STEP 1: PRE-CHECK FOR DUPLICATE user_id VALUES
+-- The constraint cannot be added while a table holds two responses for the
+-- same user. This lists them (no rows = nothing to clean up):
+-- ----------------------------------------------------------------------------
+
+SELECT 'survey_2021_responses' AS table_name, user_id, COUNT(*) AS responses
+FROM survey_2021_responses WHERE user_id IS NOT NULL GROUP BY user_id HAVING COUNT(*) > 1
+UNION ALL
+SELECT 'survey_2022_responses', user_id, COUNT(*)
+FROM survey_2022_responses WHERE user_id IS NOT NULL GROUP BY user_id HAVING COUNT(*) > 1
+UNION ALL
+SELECT 'survey_2023_responses', user_id, COUNT(*)
+FROM survey_2023_responses WHERE user_id IS NOT NULL GROUP BY user_id HAVING COUNT(*) > 1
+UNION ALL
+SELECT 'survey_2024_responses', user_id, COUNT(*)
+FROM survey_2024_responses WHERE user_id IS NOT NULL GROUP BY user_id HAVING COUNT(*) > 1
+ORDER BY table_name, user_id;
+
+-- ----------------------------------------------------------------------------
+-- STEP 2 (ONLY IF STEP 1 RETURNED ROWS): REMOVE DUPLICATES
+-- Review the rows above first. This keeps each user's earliest response and
+-- deletes the later ones (and, through ON DELETE CASCADE, their multi-select
+-- rows). Uncomment and run once per affected table:
+-- ----------------------------------------------------------------------------
+
+-- DELETE FROM survey_2021_responses r
+-- USING (
+--     SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at, id) AS rn
+--     FROM survey_2021_responses
+--     WHERE user_id IS NOT NULL
+-- ) d
+-- WHERE r.id = d.id AND d.rn > 1;
+
+-- ----------------------------------------------------------------------------
+-- STEP 3: ADD THE CONSTRAINTS
+-- Stops with a message naming the table if duplicates are still present.
+-- ----------------------------------------------------------------------------
+
+DO $$
+DECLARE
+    year INTEGER;
+    table_name TEXT;
+    constraint_name TEXT;
+    duplicates INTEGER;
+BEGIN
+    FOREACH year IN ARRAY ARRAY[2021, 2022, 2023, 2024] LOOP
+        table_name := format('survey_%s_responses', year);
+        constraint_name := table_name || '_user_id_key';
+
+        IF EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE conname = constraint_name
+              AND conrelid = format('public.%I', table_name)::regclass
+        ) THEN
+            RAISE NOTICE '% already exists', constraint_name;
+            CONTINUE;
+        END IF;
+
+        EXECUTE format(
+            'SELECT COUNT(*) FROM (SELECT user_id FROM public.%I WHERE user_id IS NOT NULL '
+            'GROUP BY user_id HAVING COUNT(*) > 1) d',
+            table_name
+        ) INTO duplicates;
+        IF duplicates > 0 THEN
+            RAISE EXCEPTION '% has % user_id value(s) with more than one response; run STEP 1 and STEP 2 first',
+                table_name, duplicates;
+        END IF;
+
+        EXECUTE format('ALTER TABLE public.%I ADD CONSTRAINT %I UNIQUE (user_id)', table_name, constraint_name);
+        RAISE NOTICE 'Added %', constraint_name;
+    END LOOP;
+END $$;
@@ -0,0 +1,111 @@
+"""
+SUPABASE AUTH USER DIRECTORY
+Pages through every auth user once and keeps a case-insensitive
+email -> user_id index, so importers resolve users in O(1) instead of
+calling auth.admin.list_users() (first page only) for every row.
+
+Usage:
+    directory = AuthUserDirectory.for_client(supabase)
+    user_id = directory.get(email)        # loads all pages on first use
+    directory.add(email, new_user_id)     # keep the index current after a create
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _field(user: Any, name: str) -> Any:
+    """Read a field from a gotrue User object or a raw JSON dict"""
+    if isinstance(user, dict):
+        return user.get(name)
+    return getattr(user, name, None)
+
+
+class AuthUserDirectory:
+    """Case-insensitive email -> user_id index over all Supabase auth users"""
+
+    # Largest page GoTrue's admin list endpoint serves
+    PER_PAGE = 1000
+
+    # One directory per client object, shared by every caller in the process
+    _instances: Dict[int, 'AuthUserDirectory'] = {}
+
+    def __init__(self, fetch_page: Callable[[int, int], List[Any]], per_page: Optional[int] = None):
+        """fetch_page(page, per_page) returns the users of one 1-based page"""
+        self.fetch_page = fetch_page
+        self.per_page = per_page or self.PER_PAGE
+        self.index: Dict[str, str] = {}
+        self.loaded = False
+
+    @classmethod
+    def for_client(cls, supabase) -> 'AuthUserDirectory':
+        """Directory backed by a supabase-py client (auth.admin.list_users)"""
+        key = id(supabase)
+        if key not in cls._instances:
+            cls._instances[key] = cls(
+                lambda page, per_page: supabase.auth.admin.list_users(page=page, per_page=per_page)
+            )
+        return cls._instances[key]
+
+    @classmethod
+    def for_rest(cls, session, supabase_url: str, headers: Dict[str, str]) -> 'AuthUserDirectory':
+        """Directory backed by raw GET /auth/v1/admin/users requests"""
+        url = f"{supabase_url.rstrip('/')}/auth/v1/admin/users"
+
+        def fetch_page(page: int, per_page: int) -> List[Any]:
+            response = session.get(url, headers=headers, params={'page': page, 'per_page': per_page}, timeout=30)
+            response.raise_for_status()
+            return response.json().get('users', [])
+
+        return cls(fetch_page)
+
+    def load(self):
+        """(Re)build the index from every page of auth users"""
+        index: Dict[str, str] = {}
+        page = 0
+        previous_ids = None
+        while True:
+            # GoTrue may cap per_page below what was asked, so a short page does not
+            # mean the last page: keep going until one comes back empty
+            users = self.fetch_page(page + 1, self.per_page) or []
+            ids = [_field(user, 'id') for user in users]
+            if not users or ids == previous_ids:
+                break
+            page += 1
+            previous_ids = ids
+            for user in users:
+                email = _field(user, 'email')
+                if email:
+                    index[email.strip().lower()] = _field(user, 'id')
+        # Update in place so callers holding a reference to index stay in sync
+        self.index.clear()
+        self.index.update(index)
+        self.loaded = True
+        logger.info(f"Indexed {len(index)} auth users ({page} page(s))")
+
+    def refresh(self):
+        """Reload the index, e.g. after users were created by another process"""
+        self.load()
+
+    def get(self, email: str) -> Optional[str]:
+        """user_id for an email (case-insensitive), loading the index on first use"""
+        if not email:
+            return None
+        if not self.loaded:
+            self.load()
+        return self.index.get(email.strip().lower())
+
+    def add(self, email: str, user_id: str):
+        """Record a user created after the index was loaded"""
+        if email and user_id:
+            self.index[email.strip().lower()] = user_id
+
+    def __contains__(self, email: str) -> bool:
+        return self.get(email) is not None
+
+    def __len__(self) -> int:
+        if not self.loaded:
+            self.load()
+        return len(self.index)
@@ -1,16 +1,27 @@
 """
 SQL FILE COMBINER
 Combines all individual .txt SQL files from Migration TXTs folder into one master SQL file
+(.txt.gz files written by datamigration.py --gzip are decompressed on the fly)
 
 Run: python combine_sql_files.py
 """
 
 import os
+import gzip
+import shutil
 from datetime import datetime
 import glob
 
+
+def open_sql_file(path: str):
+    """Open a .txt or .txt.gz SQL file for reading as text"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
 def combine_sql_files():
-    """Combine all .txt files from Migration TXTs folder into one master SQL file"""
+    """Combine all .txt / .txt.gz files from Migration TXTs folder into one master SQL file"""
     
     # Paths
     input_dir = r"C:\Users\almul\Downloads\Migration TXTs"
@@ -28,17 +39,25 @@ def combine_sql_files():
         print(f"❌ Error: Directory not found: {input_dir}")
         return
     
-    # Get all .txt files in the directory
-    txt_files = glob.glob(os.path.join(input_dir, "*.txt"))
+    # Get all .txt and .txt.gz files in the directory
+    txt_files = glob.glob(os.path.join(input_dir, "*.txt")) + glob.glob(os.path.join(input_dir, "*.txt.gz"))
     
     if not txt_files:
-        print(f"❌ Error: No .txt files found in {input_dir}")
+        print(f"❌ Error: No .txt or .txt.gz files found in {input_dir}")
+        return
+    
+    # A plain and a gzipped copy of the same file (e.g. left over from an earlier run) would be combined twice
+    duplicates = sorted(f for f in txt_files if f.endswith('.gz') and f[:-3] in txt_files)
+    if duplicates:
+        print("❌ Error: both .txt and .txt.gz versions found, remove the stale one(s):")
+        for file in duplicates:
+            print(f"  - {os.path.basename(file[:-3])} / {os.path.basename(file)}")
         return
     
     # Sort files: master tables first (00_master_tables.txt), then others
     txt_files.sort()
     
-    print(f"\n📁 Found {len(txt_files)} .txt files")
+    print(f"\n📁 Found {len(txt_files)} .txt / .txt.gz files")
     print("\nFiles to combine:")
     for i, file in enumerate(txt_files, 1):
         filename = os.path.basename(file)
@@ -68,9 +87,8 @@ def combine_sql_files():
                 outfile.write(f"-- ============================================================================\n\n")
                 
                 # Read and write file content
-                with open(txt_file, 'r', encoding='utf-8') as infile:
-                    content = infile.read()
-                    outfile.write(content)
+                with open_sql_file(txt_file) as infile:
+                    shutil.copyfileobj(infile, outfile)
                     outfile.write("\n\n")
         
         # Get output file size
@@ -0,0 +1,142 @@
+"""
+FUZZY COMPANY MATCHING INDEX
+Merges near-duplicate firm names across survey years, e.g.
+"xyz capital partners" (2022) and "xyz capital" (2024).
+
+Names are blocked on the first letters of their leading distinctive token,
+so a new name is only compared with the names in its block (never all pairs). Within a block the
+Jaro-Winkler similarity of the names (leading stopwords dropped) decides; the
+best candidate at or above the threshold is proposed as the merge target.
+Names that differ in a series number ("fund i" / "fund ii") never merge.
+
+Usage:
+    index = CompanyMatchIndex(threshold=0.9)
+    canonical = index.resolve("xyz capital")   # existing name or the new name itself
+    index.merges                               # [(name, canonical, score), ...]
+"""
+
+import re
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Leading words that say nothing about which firm it is
+STOPWORDS = {'the'}
+
+# Fund / vehicle series markers: 2, iii, ...
+SERIES_PATTERN = re.compile(r'^(?:\d+|[ivx]+)$')
+
+
+def jaro_winkler(a: str, b: str, prefix_scale: float = 0.1) -> float:
+    """Jaro-Winkler similarity in [0, 1]"""
+    if a == b:
+        return 1.0
+    len_a, len_b = len(a), len(b)
+    if not len_a or not len_b:
+        return 0.0
+
+    window = max(0, max(len_a, len_b) // 2 - 1)
+    a_matched = [False] * len_a
+    b_matched = [False] * len_b
+    matches = 0
+    for i, ch in enumerate(a):
+        for j in range(max(0, i - window), min(i + window + 1, len_b)):
+            if not b_matched[j] and b[j] == ch:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    j = 0
+    for i in range(len_a):
+        if a_matched[i]:
+            while not b_matched[j]:
+                j += 1
+            if a[i] != b[j]:
+                transpositions += 1
+            j += 1
+
+    jaro = (matches / len_a + matches / len_b + (matches - transpositions / 2) / matches) / 3
+
+    prefix = 0
+    for ch_a, ch_b in zip(a[:4], b[:4]):
+        if ch_a != ch_b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+class CompanyMatchIndex:
+    """Blocked fuzzy index over normalized company names"""
+
+    # Names whose lengths differ more than this cannot reach a useful score
+    MIN_LENGTH_RATIO = 0.5
+
+    # Block on this many leading characters of the first distinctive token
+    BLOCK_PREFIX = 3
+
+    def __init__(self, threshold: float = 0.9):
+        self.threshold = threshold
+        self.names: Set[str] = set()
+        # block key -> [(name, comparable form, series markers)]
+        self.blocks: Dict[str, List[Tuple[str, str, frozenset]]] = defaultdict(list)
+        self.aliases: Dict[str, str] = {}  # merged name -> canonical name
+        self.merges: List[Tuple[str, str, float]] = []  # (name, merged into, score)
+
+    @staticmethod
+    def parse(name: str) -> Tuple[Optional[str], str, frozenset]:
+        """(block key, comparable form, series markers) of a name"""
+        tokens = TOKEN_PATTERN.findall(name.lower())
+        start = 0
+        while start < len(tokens) - 1 and tokens[start] in STOPWORDS:
+            start += 1
+        tokens = tokens[start:]
+        if not tokens:
+            return None, '', frozenset()
+        series = frozenset(token for token in tokens if SERIES_PATTERN.match(token))
+        return tokens[0][:CompanyMatchIndex.BLOCK_PREFIX], ' '.join(tokens), series
+
+    def add(self, name: str):
+        """Register a canonical name"""
+        if name and name not in self.names:
+            self.names.add(name)
+            key, comparable, series = self.parse(name)
+            if key:
+                self.blocks[key].append((name, comparable, series))
+
+    def best_match(self, name: str) -> Optional[Tuple[str, float]]:
+        """Most similar registered name in the same block, if it clears the threshold"""
+        key, comparable, series = self.parse(name)
+        best = None
+        for candidate, candidate_comparable, candidate_series in self.blocks.get(key, ()):
+            if series != candidate_series:
+                continue
+            shorter, longer = sorted((len(comparable), len(candidate_comparable)))
+            if shorter < longer * self.MIN_LENGTH_RATIO:
+                continue
+            score = jaro_winkler(comparable, candidate_comparable)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (candidate, score)
+        return best
+
+    def resolve(self, name: str) -> str:
+        """Canonical name for `name`: itself if known, else its best match, else registered as new"""
+        if not name or name in self.names:
+            return name
+        if name in self.aliases:
+            return self.aliases[name]
+        match = self.best_match(name)
+        if match:
+            canonical, score = match
+            self.aliases[name] = canonical
+            self.merges.append((name, canonical, score))
+            logger.info(f"  ~ Merging company '{name}' into '{canonical}' (score {score:.3f})")
+            return canonical
+        self.add(name)
+        return name
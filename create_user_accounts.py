@@ -11,10 +11,11 @@ Date: 2025-01-18
 import os
 import pandas as pd
 from dotenv import load_dotenv
-from supabase import create_client, Client
 import re
 from typing import Set, List, Dict
-import time
+
+from user_provisioning import UserProvisioner, STATUS_CREATED, STATUS_EXISTING
+from excel_cache import read_excel_cached, excel_columns
 
 # Load environment variables
 load_dotenv()
@@ -61,11 +62,8 @@ def extract_emails_from_excel(file_path: str, email_columns: List[str]) -> Set[s
     emails = set()
     
     try:
-        # Read the Excel file
-        df = pd.read_excel(file_path, sheet_name=0)
-        
         # Find the actual column names in the file that match our expected columns
-        available_columns = df.columns.tolist()
+        available_columns = excel_columns(file_path, sheet_name=0)
         found_columns = []
         
         # Try to find the best match for each expected email column
@@ -92,6 +90,9 @@ def extract_emails_from_excel(file_path: str, email_columns: List[str]) -> Set[s
         
         print(f"   Using email column(s): {found_columns}")
         
+        # Read only the email columns (from the cache after the first run)
+        df = read_excel_cached(file_path, sheet_name=0, columns=found_columns)
+        
         # Extract emails from all found email columns
         for col in found_columns:
             if col not in df.columns:
@@ -145,41 +146,14 @@ def get_all_unique_emails(base_dir: str) -> List[str]:
     
     return unique_emails
 
-def create_user_account(supabase: Client, email: str, password: str) -> Dict:
-    """Create a user account in Supabase Auth."""
-    try:
-        # Create user with Supabase Admin API
-        response = supabase.auth.admin.create_user({
-            "email": email,
-            "password": password,
-            "email_confirm": True  # Auto-confirm email
-        })
-        
-        return {
-            "email": email,
-            "success": True,
-            "user_id": response.user.id if response.user else None,
-            "error": None
-        }
-        
-    except Exception as e:
-        error_msg = str(e)
-        
-        # Check if user already exists
-        if "already registered" in error_msg.lower() or "duplicate" in error_msg.lower():
-            return {
-                "email": email,
-                "success": False,
-                "user_id": None,
-                "error": "User already exists"
-            }
-        
-        return {
-            "email": email,
-            "success": False,
-            "user_id": None,
-            "error": error_msg
-        }
+def to_detail(result: Dict) -> Dict:
+    """Convert a provisioning result into the report's detail format."""
+    return {
+        "email": result["email"],
+        "success": result["status"] == STATUS_CREATED,
+        "user_id": result["user_id"],
+        "error": "User already exists" if result["status"] == STATUS_EXISTING else result["error"]
+    }
 
 def create_all_accounts(emails: List[str]) -> Dict:
     """Create accounts for all unique emails."""
@@ -194,8 +168,8 @@ def create_all_accounts(emails: List[str]) -> Dict:
         print("   - SUPABASE_SERVICE_ROLE_KEY")
         return {"created": 0, "skipped": 0, "failed": 0}
     
-    # Initialize Supabase client with service role key
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    # Provision on a bounded worker pool; rate limiting and retries live in UserProvisioner
+    provisioner = UserProvisioner(SUPABASE_URL, SUPABASE_SERVICE_KEY)
     
     results = {
         "created": 0,
@@ -205,26 +179,29 @@ def create_all_accounts(emails: List[str]) -> Dict:
     }
     
     total = len(emails)
+    done = 0
     
-    for idx, email in enumerate(emails, 1):
-        print(f"\n[{idx}/{total}] Creating account for: {email}")
-        
-        result = create_user_account(supabase, email, DEFAULT_PASSWORD)
-        results["details"].append(result)
-        
-        if result["success"]:
-            print(f"   ✅ Account created successfully (User ID: {result['user_id']})")
+    def report(result: Dict):
+        nonlocal done
+        done += 1
+        detail = to_detail(result)
+        if detail["success"]:
+            print(f"[{done}/{total}] ✅ {detail['email']} created (User ID: {detail['user_id']})")
             results["created"] += 1
-        elif result["error"] == "User already exists":
-            print(f"   ⏭️  Account already exists, skipping...")
+        elif detail["error"] == "User already exists":
+            print(f"[{done}/{total}] ⏭️  {detail['email']} already exists, skipping...")
             results["skipped"] += 1
         else:
-            print(f"   ❌ Failed: {result['error']}")
+            print(f"[{done}/{total}] ❌ {detail['email']} failed: {detail['error']}")
             results["failed"] += 1
-        
-        # Rate limiting: pause briefly between requests
-        if idx < total:
-            time.sleep(0.5)
+    
+    outcomes = provisioner.provision(
+        [{"email": email, "password": DEFAULT_PASSWORD} for email in emails],
+        on_result=report
+    )
+    
+    # Keep the report in the original (sorted) email order
+    results["details"] = [to_detail(outcomes[email]) for email in emails]
     
     return results
 
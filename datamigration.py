@@ -10,12 +10,19 @@ Features:
 - Infers data types from response values
 - No email tracking (responses are independent)
 - Generates individual SQL .txt files per response
+- Streams SQL to disk as it is generated (constant memory)
+- Optional long layout: all answers in one partitioned survey_answers table,
+  written as multi-row INSERT ... VALUES blocks
+- Optional COPY export: tab-separated files for COPY ... FROM STDIN plus a manifest
+- Optional fuzzy matching of near-duplicate company names across years
+- Optional process pool: one worker per survey year, merged deterministically
 
-Run: python datamigration.py
+Run: python datamigration.py [--gzip] [--layout tables|long] [--format sql|copy] [--match-companies 0.90] [--workers 4]
 Output: C:\\Users\\almul\\Downloads\\Migration TXTs\\
 """
 
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import logging
 import sys
@@ -24,6 +31,16 @@ import re
 from typing import List, Dict, Any, Optional, Tuple
 from collections import defaultdict
 import unicodedata
+from functools import lru_cache
+
+from company_matching import CompanyMatchIndex
+from excel_cache import read_excel_cached
+import argparse
+import gzip
+import json
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 # Configure logging with UTF-8 encoding for Windows
 logging.basicConfig(
@@ -44,6 +61,18 @@ if sys.platform == 'win32':
 class CompanyNameNormalizer:
     """Normalizes company names for matching across different years"""
     
+    # Common company suffixes (Ltd, Inc, Corp, etc.), stripped in this order
+    SUFFIXES = [
+        r'\bltd\.?$', r'\blimited$', r'\binc\.?$', r'\bincorporated$',
+        r'\bcorp\.?$', r'\bcorporation$', r'\bllc\.?$', r'\bplc\.?$',
+        r'\bco\.?$', r'\bcompany$', r'\bgroup$', r'\bholdings?$'
+    ]
+    SUFFIX_PATTERNS = [re.compile(suffix, re.IGNORECASE) for suffix in SUFFIXES]
+    # Matches wherever any one suffix does: names without a suffix skip the sequence
+    SUFFIX_PATTERN = re.compile('|'.join(SUFFIXES), re.IGNORECASE)
+    SPECIAL_CHARS_PATTERN = re.compile(r'[^a-z0-9\s]')
+    WHITESPACE_PATTERN = re.compile(r'\s+')
+    
     @staticmethod
     def normalize(company_name: str) -> str:
         """
@@ -56,33 +85,57 @@ class CompanyNameNormalizer:
         if not company_name or pd.isna(company_name):
             return ""
         
-        # Convert to string and lowercase
-        name = str(company_name).lower().strip()
+        return CompanyNameNormalizer._normalize_cached(str(company_name))
+    
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def _normalize_cached(company_name: str) -> str:
+        """normalize() for a raw name string; names repeat heavily across years"""
+        # Convert to lowercase
+        name = company_name.lower().strip()
         
         # Remove unicode accents
-        name = unicodedata.normalize('NFKD', name)
-        name = ''.join([c for c in name if not unicodedata.combining(c)])
-        
-        # Remove common company suffixes
-        suffixes = [
-            r'\bltd\.?$', r'\blimited$', r'\binc\.?$', r'\bincorporated$',
-            r'\bcorp\.?$', r'\bcorporation$', r'\bllc\.?$', r'\bplc\.?$',
-            r'\bco\.?$', r'\bcompany$', r'\bgroup$', r'\bholdings?$'
-        ]
-        for suffix in suffixes:
-            name = re.sub(suffix, '', name, flags=re.IGNORECASE)
+        if not name.isascii():
+            name = unicodedata.normalize('NFKD', name)
+            name = ''.join([c for c in name if not unicodedata.combining(c)])
+        
+        # Remove common company suffixes (one after another, so glued ones like "Co.Ltd" both go)
+        if CompanyNameNormalizer.SUFFIX_PATTERN.search(name):
+            for pattern in CompanyNameNormalizer.SUFFIX_PATTERNS:
+                name = pattern.sub('', name)
         
         # Remove special characters except spaces
-        name = re.sub(r'[^a-z0-9\s]', '', name)
+        name = CompanyNameNormalizer.SPECIAL_CHARS_PATTERN.sub('', name)
         
         # Remove extra whitespace
-        name = re.sub(r'\s+', ' ', name).strip()
+        name = CompanyNameNormalizer.WHITESPACE_PATTERN.sub(' ', name).strip()
         
         return name
+    
+    @classmethod
+    def normalize_series(cls, names: pd.Series) -> pd.Series:
+        """Normalize a pandas column, computing each distinct name once"""
+        codes, uniques = pd.factorize(names)
+        # Trailing "" is picked up by code -1 (missing values)
+        lookup = np.array([cls.normalize(name) for name in uniques] + [""], dtype=object)
+        return pd.Series(lookup[codes], index=names.index, dtype=object)
 
 
 class DataTypeInferencer:
-    """Infers PostgreSQL data types from pandas values"""
+    """Infers PostgreSQL data types from pandas values, one type per question column"""
+    
+    # Cheap string checks, tried before any date parsing (so "2015" is an INTEGER, "Q1" is TEXT)
+    INTEGER_PATTERN = re.compile(r'^[+-]?\d+$')
+    NUMERIC_PATTERN = re.compile(r'^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$')
+    DATE_PATTERN = re.compile(
+        r'^(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{2,4})'
+        r'(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?$'
+    )
+    BOOLEAN_STRINGS = {'true', 'false', 'yes', 'no', 't', 'f', 'y', 'n'}
+    NULL_STRINGS = {'N/A', 'NA', 'NULL', ''}
+    
+    # Values inspected per column
+    SAMPLE_SIZE = 500
     
     @staticmethod
     def infer_postgres_type(value: Any) -> str:
@@ -90,58 +143,247 @@ class DataTypeInferencer:
         if pd.isna(value) or value == "" or str(value).strip().upper() in ['N/A', 'NA', 'NULL']:
             return "TEXT"  # Default for null values
         
-        # Try to infer from actual value
-        if isinstance(value, bool):
+        return DataTypeInferencer._classify(value)
+    
+    @staticmethod
+    def _classify(value: Any) -> str:
+        """Type of one non-empty value"""
+        if isinstance(value, (bool, np.bool_)):
             return "BOOLEAN"
-        elif isinstance(value, int):
+        elif isinstance(value, (int, np.integer)):
             return "INTEGER"
         elif isinstance(value, float):
             return "NUMERIC"
         elif isinstance(value, datetime):
             return "TIMESTAMP"
         elif isinstance(value, str):
-            # Check if it's a date string
-            if DataTypeInferencer._is_date(value):
-                return "TIMESTAMP"
-            # Check if it's a number string
-            elif DataTypeInferencer._is_integer(value):
+            text = value.strip()
+            if DataTypeInferencer.INTEGER_PATTERN.match(text):
                 return "INTEGER"
-            elif DataTypeInferencer._is_numeric(value):
+            elif DataTypeInferencer.NUMERIC_PATTERN.match(text):
                 return "NUMERIC"
-            # Check if it's a boolean string
-            elif value.lower() in ['true', 'false', 'yes', 'no', 't', 'f', 'y', 'n']:
+            elif DataTypeInferencer.DATE_PATTERN.match(text):
+                return "TIMESTAMP"
+            elif text.lower() in DataTypeInferencer.BOOLEAN_STRINGS:
                 return "BOOLEAN"
             else:
                 return "TEXT"
         else:
             return "TEXT"
     
-    @staticmethod
-    def _is_date(value: str) -> bool:
-        """Check if string is a date"""
-        try:
-            pd.to_datetime(value)
-            return True
-        except:
-            return False
+    @classmethod
+    def infer_column_type(cls, series: pd.Series) -> str:
+        """One type for a whole column, from an evenly spaced sample of its non-empty values"""
+        values = series[series.notna()]
+        is_str = values.apply(isinstance, args=(str,)).astype(bool)
+        if is_str.any():
+            values = values[~is_str | ~values.where(is_str, '').str.strip().str.upper().isin(cls.NULL_STRINGS)]
+        if values.empty:
+            return "TEXT"
+        
+        if len(values) > cls.SAMPLE_SIZE:
+            values = values.iloc[np.linspace(0, len(values) - 1, cls.SAMPLE_SIZE).astype(int)]
+        
+        types = {cls._classify(value) for value in values}
+        if len(types) == 1:
+            return types.pop()
+        if types == {"INTEGER", "NUMERIC"}:
+            return "NUMERIC"
+        return "TEXT"
     
-    @staticmethod
-    def _is_integer(value: str) -> bool:
-        """Check if string is an integer"""
-        try:
-            int(value)
-            return True
-        except:
-            return False
+    @classmethod
+    def infer_column_types(cls, df: pd.DataFrame) -> Dict[str, str]:
+        """Column name -> PostgreSQL type for every column of a survey sheet"""
+        return {column: cls.infer_column_type(df[column]) for column in df.columns}
+
+
+class SqlStreamWriter:
+    """Writes SQL statements to a .txt (or .txt.gz) file as they are generated; keeps only counters"""
+    
+    def __init__(self, filepath: str, title: Optional[str], compress: bool = False):
+        """title=None writes a bare shard: no header or footer"""
+        self.filepath = filepath + '.gz' if compress else filepath
+        self.title = title
+        self.statement_count = 0
+        if compress:
+            self.file = gzip.open(self.filepath, 'wt', encoding='utf-8')
+        elif title is None:
+            # Shards are copied verbatim into a text-mode file, so no newline translation here
+            self.file = open(self.filepath, 'w', encoding='utf-8', newline='')
+        else:
+            self.file = open(self.filepath, 'w', encoding='utf-8')
+        if title:
+            self.file.write(f"-- {title}\n")
+            self.file.write(f"-- Generated: {datetime.now().isoformat()}\n\n")
+    
+    def write(self, sql: str, description: str = ""):
+        """Append one statement"""
+        self.file.write(f"-- {description}\n{sql};\n\n")
+        self.statement_count += 1
+    
+    def close(self):
+        """Write the statement count footer and close the file"""
+        if not self.file.closed:
+            if self.title:
+                self.file.write(f"-- Total statements: {self.statement_count}\n")
+            self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ShardId(int):
+    """
+    Year-local response id used by process-pool workers. It renders as a
+    placeholder token, which the merge rewrites to the global id.
+    """
+    
+    KIND = 'R'
+    
+    def __str__(self):
+        return f"\x1b{self.KIND}{int(self)}\x1b"
+    
+    def __format__(self, spec):
+        return str(self)
+    
+    __repr__ = __str__
+
+
+class ShardCompanyId(ShardId):
+    """Year-local company id placeholder"""
+    
+    KIND = 'C'
+
+
+SHARD_TOKEN_PATTERN = re.compile('\x1b([RC])(\\d+)\x1b')
+
+
+def generate_year_shard(job: Tuple[int, str, str, str, int]) -> Dict[str, Any]:
+    """
+    Process-pool worker: parse one survey year and write its response data to
+    shard files, numbering companies and responses locally from 1.
+    """
+    year, shard_dir, layout, output_format, rows_per_insert = job
+    migrator = DynamicSurveyMigrator(output_dir=shard_dir, layout=layout, rows_per_insert=rows_per_insert,
+                                     output_format=output_format, shard_ids=True)
+    shard = {'year': year, 'files': {}, 'rows': {}}
+    
+    if migrator.output_format == migrator.FORMAT_COPY:
+        responses = CopyStreamWriter(os.path.join(shard_dir, f"{year}_responses.tsv"),
+                                     'survey_responses', migrator.RESPONSE_COLUMNS)
+        answers = CopyStreamWriter(os.path.join(shard_dir, f"{year}_answers.tsv"),
+                                   migrator.ANSWERS_TABLE, migrator.ANSWER_COLUMNS)
+        migrator.registration_rows, migrator.answer_rows = responses, answers
+        with responses, answers:
+            migrator.process_survey_year(year)
+        shard['files'] = {'responses': responses.filepath, 'answers': answers.filepath}
+        shard['rows'] = {'responses': responses.row_count, 'answers': answers.row_count}
+    else:
+        with SqlStreamWriter(os.path.join(shard_dir, f"{year}.sql"), None) as writer:
+            migrator.writer = writer
+            migrator.process_survey_year(year)
+        shard['files'] = {'sql': writer.filepath}
+    
+    shard['statements'] = migrator.total_statements
+    shard['responses'] = migrator.response_id_counter - 1
+    # Local company ids are 1..n in this order
+    shard['companies'] = [
+        (normalized, info['original_name'])
+        for normalized, info in sorted(migrator.company_registry.items(), key=lambda x: x[1]['id'])
+    ]
+    return shard
+
+
+class ValuesBatcher:
+    """Collects rows for one table and emits them as multi-row INSERT ... VALUES statements"""
+    
+    def __init__(self, migrator: 'DynamicSurveyMigrator', table: str, columns: List[str], max_rows: int):
+        self.migrator = migrator
+        self.table = table
+        self.columns = columns
+        self.max_rows = max_rows
+        self.rows: List[str] = []
     
     @staticmethod
-    def _is_numeric(value: str) -> bool:
-        """Check if string is numeric"""
-        try:
-            float(value)
-            return True
-        except:
-            return False
+    def sql_literal(value: Any) -> str:
+        """SQL literal for an int / str / None value"""
+        if value is None:
+            return "NULL"
+        if isinstance(value, int):
+            return str(value)
+        return "'" + str(value).replace("'", "''") + "'"
+    
+    def add(self, values: Tuple):
+        """Queue one row, flushing when the block is full"""
+        self.rows.append("(" + ", ".join(self.sql_literal(v) for v in values) + ")")
+        if len(self.rows) >= self.max_rows:
+            self.flush()
+    
+    def flush(self):
+        """Write the queued rows as one INSERT"""
+        if not self.rows:
+            return
+        sql = f"""INSERT INTO {self.table} ({', '.join(self.columns)})
+VALUES
+""" + ",\n".join(self.rows)
+        self.migrator.add_sql(sql, f"Insert {len(self.rows)} rows into {self.table}")
+        self.rows = []
+
+
+class CopyStreamWriter:
+    """Writes rows for one table as a tab-separated COPY text-format file; keeps only a row count"""
+    
+    # COPY text format escapes (NULL is written as \N)
+    ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+    
+    def __init__(self, filepath: str, table: str, columns: List[str], compress: bool = False):
+        self.filepath = filepath + '.gz' if compress else filepath
+        self.table = table
+        self.columns = columns
+        self.row_count = 0
+        if compress:
+            self.file = gzip.open(self.filepath, 'wt', encoding='utf-8', newline='\n')
+        else:
+            self.file = open(self.filepath, 'w', encoding='utf-8', newline='\n')
+    
+    @classmethod
+    def copy_field(cls, value: Any) -> str:
+        """One COPY text-format field"""
+        if value is None:
+            return "\\N"
+        return str(value).translate(cls.ESCAPES)
+    
+    def add(self, values: Tuple):
+        """Write one row"""
+        self.file.write("\t".join(self.copy_field(v) for v in values) + "\n")
+        self.row_count += 1
+    
+    def flush(self):
+        """Rows are written as they arrive; nothing is buffered"""
+    
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+    
+    def manifest_entry(self) -> Dict[str, Any]:
+        """How to load this file"""
+        return {
+            'table': self.table,
+            'file': os.path.basename(self.filepath),
+            'compressed': self.filepath.endswith('.gz'),
+            'columns': self.columns,
+            'rows': self.row_count,
+            'copy': f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN"
+        }
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
 class DynamicSurveyMigrator:
@@ -167,28 +409,83 @@ class DynamicSurveyMigrator:
         }
     }
     
-    def __init__(self, output_dir: str = r"C:\Users\almul\Downloads\Migration TXTs"):
+    # Output files, in the order combine_sql_files.py concatenates them
+    MASTER_FILE = "00_master_tables.txt"
+    COMPANIES_FILE = "01_companies_data.txt"
+    RESPONSES_FILE = "02_survey_responses_data.txt"
+    
+    # COPY export files, loaded in this order after 00_master_tables.txt
+    COPY_COMPANIES_FILE = "01_companies.tsv"
+    COPY_RESPONSES_FILE = "02_survey_responses.tsv"
+    COPY_ANSWERS_FILE = "03_survey_answers.tsv"
+    COPY_MANIFEST_FILE = "copy_manifest.json"
+    
+    # Fuzzy company merges applied, for review (not .txt, so combine_sql_files.py skips it)
+    COMPANY_MERGES_FILE = "company_merges.csv"
+    
+    # Output layouts: one table per response, or one shared long-format answers table
+    LAYOUT_TABLES = 'tables'
+    LAYOUT_LONG = 'long'
+    ANSWERS_TABLE = 'survey_answers'
+    
+    # Output formats: SQL statements, or COPY text-format data files
+    FORMAT_SQL = 'sql'
+    FORMAT_COPY = 'copy'
+    
+    ANSWER_COLUMNS = ['response_id', 'survey_year', 'question_column', 'original_question', 'response_value', 'data_type']
+    RESPONSE_COLUMNS = ['response_id', 'company_id', 'company_name', 'survey_year', 'table_name']
+    COMPANY_COLUMNS = ['company_id', 'company_name', 'normalized_name']
+    
+    def __init__(self, output_dir: str = r"C:\Users\almul\Downloads\Migration TXTs", compress: bool = False,
+                 layout: str = LAYOUT_TABLES, rows_per_insert: int = 500, output_format: str = FORMAT_SQL,
+                 company_match_threshold: Optional[float] = None, workers: int = 1, shard_ids: bool = False):
         """Initialize the migrator"""
         self.output_dir = output_dir
+        self.compress = compress  # gzip the streamed response data
+        self.output_format = output_format
+        # COPY rows need a fixed target table, so the COPY export always uses the long layout
+        self.layout = self.LAYOUT_LONG if output_format == self.FORMAT_COPY else layout
+        self.rows_per_insert = rows_per_insert  # rows per multi-row INSERT in the long layout
         self.company_registry: Dict[str, Dict] = {}  # normalized_name -> {id, original_name}
+        # Folds near-duplicate normalized names into the first registered spelling (None = exact only)
+        self.company_matcher = CompanyMatchIndex(company_match_threshold) if company_match_threshold else None
         self.company_id_counter = 1
         self.response_id_counter = 1
-        self.all_sql_statements: List[str] = []
+        self.workers = workers  # > 1: process survey years in a process pool
+        self.shard_ids = shard_ids  # worker mode: ids are year-local placeholders
+        self.question_types: Dict[int, Dict[str, str]] = {}  # year -> question column -> type
+        self.writer: Optional[SqlStreamWriter] = None  # file add_sql currently streams into
+        self.total_statements = 0
+        
+        # Long layout: answers and registrations go out in multi-row VALUES blocks
+        # (replaced by CopyStreamWriters for the COPY export)
+        self.answer_rows = ValuesBatcher(self, self.ANSWERS_TABLE, self.ANSWER_COLUMNS, rows_per_insert)
+        self.registration_rows = ValuesBatcher(self, 'survey_responses', self.RESPONSE_COLUMNS, rows_per_insert)
         
         # Create output directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
     
     def add_sql(self, sql: str, description: str = ""):
-        """Add SQL statement to the collection"""
-        self.all_sql_statements.append(f"-- {description}\n{sql};\n")
+        """Stream SQL statement to the current output file"""
+        self.writer.write(sql, description)
+        self.total_statements += 1
         logger.info(f"  ✓ Generated SQL: {description}")
     
     def create_master_tables(self):
-        """Create companies and survey_responses master tables"""
+        """Create companies and survey_responses master tables (written to 00_master_tables.txt)"""
         logger.info("\n" + "="*80)
         logger.info("CREATING MASTER TABLES")
         logger.info("="*80)
         
+        with SqlStreamWriter(os.path.join(self.output_dir, self.MASTER_FILE), "MASTER TABLES CREATION") as self.writer:
+            self.add_master_table_sql()
+        self.writer = None
+        logger.info(f"✓ Saved master tables SQL to: {self.MASTER_FILE}")
+        
+        logger.info("✓ Master tables SQL generated\n")
+    
+    def add_master_table_sql(self):
+        """Emit the CREATE TABLE statements for the master tables"""
         # Create companies table
         companies_sql = """
 CREATE TABLE IF NOT EXISTS companies (
@@ -211,7 +508,28 @@ CREATE TABLE IF NOT EXISTS survey_responses (
 )"""
         self.add_sql(survey_responses_sql, "Create survey_responses metadata table")
         
-        logger.info("✓ Master tables SQL generated\n")
+        if self.layout == self.LAYOUT_LONG:
+            self.add_answers_table_sql()
+    
+    def add_answers_table_sql(self):
+        """Emit the shared long-format answers table, list-partitioned by survey year"""
+        answers_sql = f"""
+CREATE TABLE IF NOT EXISTS {self.ANSWERS_TABLE} (
+    response_id INTEGER NOT NULL,
+    survey_year INTEGER NOT NULL,
+    question_column TEXT NOT NULL,
+    original_question TEXT NOT NULL,
+    response_value TEXT,
+    data_type TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (survey_year, response_id, question_column)
+) PARTITION BY LIST (survey_year)"""
+        self.add_sql(answers_sql, f"Create {self.ANSWERS_TABLE} long-format table")
+        
+        for year in sorted(self.SURVEY_CONFIGS.keys()):
+            partition_sql = f"""CREATE TABLE IF NOT EXISTS {self.ANSWERS_TABLE}_{year}
+PARTITION OF {self.ANSWERS_TABLE} FOR VALUES IN ({year})"""
+            self.add_sql(partition_sql, f"Create {self.ANSWERS_TABLE} partition for {year}")
     
     def get_or_create_company(self, company_name: str) -> int:
         """Get existing company ID (companies are pre-registered in first pass)"""
@@ -221,6 +539,9 @@ CREATE TABLE IF NOT EXISTS survey_responses (
             logger.warning(f"  ! Empty company name, skipping")
             return None
         
+        if self.company_matcher:
+            normalized = self.company_matcher.resolve(normalized)
+        
         # Get from registry (should already exist from first pass)
         if normalized in self.company_registry:
             company_id = self.company_registry[normalized]['id']
@@ -230,6 +551,12 @@ CREATE TABLE IF NOT EXISTS survey_responses (
         logger.warning(f"  ! Company not found in registry: {company_name}")
         return None
     
+    def next_response_id(self) -> int:
+        """Allocate the next response id"""
+        response_id = self.response_id_counter
+        self.response_id_counter += 1
+        return ShardId(response_id) if self.shard_ids else response_id
+    
     def is_value_empty(self, value: Any) -> bool:
         """Check if a value should be considered empty/null"""
         if pd.isna(value):
@@ -240,6 +567,13 @@ CREATE TABLE IF NOT EXISTS survey_responses (
             return True
         return False
     
+    def empty_mask(self, series: pd.Series) -> pd.Series:
+        """Column-wise is_value_empty"""
+        is_str = series.apply(isinstance, args=(str,)).astype(bool)
+        empty = series.isna()
+        empty[is_str] = series[is_str].str.strip().str.upper().isin(['N/A', 'NA', 'NULL', ''])
+        return empty
+    
     def sanitize_column_name(self, column_name: str) -> str:
         """Sanitize column name for PostgreSQL"""
         # Remove special characters, replace spaces with underscores
@@ -253,11 +587,9 @@ CREATE TABLE IF NOT EXISTS survey_responses (
         
         return sanitized or 'unnamed_column'
     
-    def create_dynamic_table_for_response(self, company_id: int, company_name: str, 
-                                         year: int, row_data: pd.Series) -> Optional[str]:
-        """Create a dynamic table based on non-null columns in the response"""
-        
-        # Filter non-null columns
+    def collect_answers(self, row_data: Dict[str, Any], year: int) -> Dict[str, Dict[str, Any]]:
+        """Non-null answers of a response: sanitized column -> {original_name, value, data_type}"""
+        question_types = self.question_types[year]
         non_null_columns = {}
         for col_name, value in row_data.items():
             if not self.is_value_empty(value):
@@ -265,16 +597,23 @@ CREATE TABLE IF NOT EXISTS survey_responses (
                 non_null_columns[sanitized_col] = {
                     'original_name': col_name,
                     'value': value,
-                    'data_type': DataTypeInferencer.infer_postgres_type(value)
+                    'data_type': question_types[col_name]
                 }
+        return non_null_columns
+    
+    def create_dynamic_table_for_response(self, company_id: int, company_name: str, 
+                                         year: int, row_data: Dict[str, Any]) -> Optional[str]:
+        """Create a dynamic table based on non-null columns in the response"""
+        
+        # Filter non-null columns
+        non_null_columns = self.collect_answers(row_data, year)
         
         if not non_null_columns:
             logger.warning(f"  ! No non-null columns found for {company_name} ({year})")
             return None
         
         # Generate table name using response_id for uniqueness
-        response_id = self.response_id_counter
-        self.response_id_counter += 1
+        response_id = self.next_response_id()
         table_name = f"survey_response_{response_id}_year_{year}"
         
         logger.info(f"  → Creating table: {table_name} with {len(non_null_columns)} columns")
@@ -316,8 +655,33 @@ VALUES ('{sanitized_col}', '{original_q}', '{response_val}', '{data_type}')"""
         
         return table_name, response_id
     
+    def add_response_answers(self, company_id: int, company_name: str,
+                             year: int, row_data: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+        """Queue a response's non-null answers as rows of the shared long-format table"""
+        non_null_columns = self.collect_answers(row_data, year)
+        
+        if not non_null_columns:
+            logger.warning(f"  ! No non-null columns found for {company_name} ({year})")
+            return None
+        
+        response_id = self.next_response_id()
+        
+        for sanitized_col, col_info in non_null_columns.items():
+            self.answer_rows.add((
+                response_id, year, sanitized_col, str(col_info['original_name']),
+                str(col_info['value']), col_info['data_type']
+            ))
+        
+        logger.info(f"  ✓ Queued {len(non_null_columns)} answers for response {response_id}")
+        
+        return self.ANSWERS_TABLE, response_id
+    
     def register_survey_response(self, response_id: int, company_id: int, company_name: str, year: int, table_name: str):
         """Register survey response in metadata table"""
+        if self.layout == self.LAYOUT_LONG:
+            self.registration_rows.add((response_id, company_id, str(company_name), year, table_name))
+            return
+        
         insert_sql = f"""INSERT INTO survey_responses (response_id, company_id, company_name, survey_year, table_name)
 VALUES ({response_id}, {company_id}, '{company_name.replace("'", "''")}', {year}, '{table_name}')"""
         
@@ -339,7 +703,7 @@ VALUES ({response_id}, {company_id}, '{company_name.replace("'", "''")}', {year}
         
         # Read Excel file
         try:
-            df = pd.read_excel(config['file_path'])
+            df = read_excel_cached(config['file_path'])
             logger.info(f"✓ Loaded {len(df)} rows from Excel file")
         except Exception as e:
             logger.error(f"✗ Failed to read Excel file: {e}")
@@ -351,52 +715,61 @@ VALUES ({response_id}, {company_id}, '{company_name.replace("'", "''")}', {year}
             logger.info(f"Available columns: {list(df.columns)[:10]}...")
             return
         
-        # First pass: collect all companies
-        logger.info("\n📋 First pass: Collecting companies...")
-        companies_to_create = []
-        
-        for idx, row in df.iterrows():
-            company_name = row[config['company_column']]
-            if not self.is_value_empty(company_name):
-                normalized = CompanyNameNormalizer.normalize(company_name)
-                if normalized and normalized not in self.company_registry:
-                    companies_to_create.append(company_name)
-                    # Pre-register to avoid duplicates
-                    company_id = self.company_id_counter
-                    self.company_id_counter += 1
-                    self.company_registry[normalized] = {
-                        'id': company_id,
-                        'original_name': company_name
-                    }
-        
-        logger.info(f"✓ Found {len(companies_to_create)} new companies")
-        
-        # Second pass: process responses
-        logger.info("\n📋 Second pass: Processing responses...")
+        # One data type per question, inferred once from a sample of the column
+        self.question_types[year] = DataTypeInferencer.infer_column_types(df)
+        
+        # Normalize the company column once, then register new companies in first-seen order
+        logger.info("\n📋 Registering companies...")
+        company_names = df[config['company_column']]
+        empty = self.empty_mask(company_names)
+        normalized = pd.Series('', index=df.index, dtype=object)
+        normalized[~empty] = CompanyNameNormalizer.normalize_series(company_names[~empty])
+        
+        # Fold near-duplicates into an already registered spelling (earlier years win)
+        if self.company_matcher:
+            canonical = {name: self.company_matcher.resolve(name) for name in pd.unique(normalized[normalized != ''])}
+            normalized = pd.Series([canonical.get(name, name) for name in normalized], index=df.index, dtype=object)
+        
+        new_companies = normalized[(normalized != '') & ~normalized.isin(list(self.company_registry))]
+        new_companies = new_companies.drop_duplicates()
+        for normalized_name, company_name in zip(new_companies, company_names[new_companies.index]):
+            self.company_registry[normalized_name] = {
+                'id': ShardCompanyId(self.company_id_counter) if self.shard_ids else self.company_id_counter,
+                'original_name': company_name
+            }
+            self.company_id_counter += 1
+        
+        logger.info(f"✓ Found {len(new_companies)} new companies")
+        
+        # Company id per row, reused by the response pass
+        company_ids = [self.company_registry[name]['id'] if name else None for name in normalized]
+        
+        # Process responses
+        logger.info("\n📋 Processing responses...")
         processed = 0
         skipped = 0
         
-        for idx, row in df.iterrows():
-            company_name = row[config['company_column']]
-            
-            if self.is_value_empty(company_name):
+        rows = zip(df.index, company_names, company_ids, df.to_dict('records'))
+        for idx, company_name, company_id, row in rows:
+            if empty[idx]:
                 logger.warning(f"  ! Row {idx+2}: Empty company name, skipping")
                 skipped += 1
                 continue
             
-            logger.info(f"\n[Row {idx+2}] Processing: {company_name}")
-            
-            # Get company ID (already registered)
-            normalized = CompanyNameNormalizer.normalize(company_name)
-            company_id = self.company_registry[normalized]['id']
+            if company_id is None:
+                logger.warning(f"  ! Row {idx+2}: Company name '{company_name}' normalizes to nothing, skipping")
+                skipped += 1
+                continue
             
-            # Track SQL statements for this response
-            response_sql_start = len(self.all_sql_statements)
+            logger.info(f"\n[Row {idx+2}] Processing: {company_name}")
             
-            # Create dynamic table and populate
-            result = self.create_dynamic_table_for_response(
-                company_id, company_name, year, row
-            )
+            # Create dynamic table and populate (or queue rows for the shared answers table)
+            if self.layout == self.LAYOUT_LONG:
+                result = self.add_response_answers(company_id, company_name, year, row)
+            else:
+                result = self.create_dynamic_table_for_response(
+                    company_id, company_name, year, row
+                )
             
             if result:
                 table_name, response_id = result
@@ -408,8 +781,72 @@ VALUES ({response_id}, {company_id}, '{company_name.replace("'", "''")}', {year}
             else:
                 skipped += 1
         
+        # Flush the long-layout VALUES blocks so each year's rows stay together
+        self.registration_rows.flush()
+        self.answer_rows.flush()
+        
         logger.info(f"\n✓ Year {year} complete: {processed} processed, {skipped} skipped")
     
+    def process_all_years(self):
+        """Process every survey year into the current outputs, sequentially or on a process pool"""
+        years = sorted(self.SURVEY_CONFIGS.keys())
+        if self.workers <= 1:
+            for year in years:
+                self.process_survey_year(year)
+            return
+        
+        logger.info(f"\n⚡ Processing {len(years)} survey years on {min(self.workers, len(years))} worker processes")
+        shard_dir = tempfile.mkdtemp(prefix='year_shards_', dir=self.output_dir)
+        try:
+            jobs = [(year, shard_dir, self.layout, self.output_format, self.rows_per_insert) for year in years]
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(years))) as pool:
+                shards = list(pool.map(generate_year_shard, jobs))
+            
+            # Merge in year order, exactly as the sequential run would number things
+            for shard in shards:
+                self.merge_year_shard(shard)
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+    
+    def merge_year_shard(self, shard: Dict[str, Any]):
+        """Register a year's companies, then append its shard files with global ids"""
+        company_ids = {}
+        for local_id, (normalized, original_name) in enumerate(shard['companies'], 1):
+            canonical = self.company_matcher.resolve(normalized) if self.company_matcher else normalized
+            if canonical not in self.company_registry:
+                self.company_registry[canonical] = {
+                    'id': self.company_id_counter,
+                    'original_name': original_name
+                }
+                self.company_id_counter += 1
+            company_ids[local_id] = self.company_registry[canonical]['id']
+        
+        response_offset = self.response_id_counter - 1
+        
+        def renumber(match) -> str:
+            local_id = int(match.group(2))
+            if match.group(1) == 'R':
+                return str(response_offset + local_id)
+            return str(company_ids[local_id])
+        
+        def append(shard_path: str, target):
+            with open(shard_path, 'r', encoding='utf-8', newline='') as shard_file:
+                for line in shard_file:
+                    target.write(SHARD_TOKEN_PATTERN.sub(renumber, line))
+        
+        if 'sql' in shard['files']:
+            append(shard['files']['sql'], self.writer.file)
+            self.writer.statement_count += shard['statements']
+        else:
+            append(shard['files']['responses'], self.registration_rows.file)
+            append(shard['files']['answers'], self.answer_rows.file)
+            self.registration_rows.row_count += shard['rows']['responses']
+            self.answer_rows.row_count += shard['rows']['answers']
+        
+        self.total_statements += shard['statements']
+        self.response_id_counter += shard['responses']
+        logger.info(f"✓ Merged year {shard['year']}: {shard['responses']} responses, {len(shard['companies'])} companies")
+    
     def save_response_sql_file(self, response_id: int, company_name: str, year: int, sql_statements: List[str]):
         """Save SQL statements for a specific response to a separate file"""
         try:
@@ -429,26 +866,10 @@ VALUES ({response_id}, {company_id}, '{company_name.replace("'", "''")}', {year}
         except Exception as e:
             logger.error(f"  ✗ Failed to save SQL file for {company_name}: {e}")
     
-    def save_master_sql_file(self):
-        """Save master tables SQL to a separate file"""
-        try:
-            filepath = os.path.join(self.output_dir, "00_master_tables.txt")
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write("-- MASTER TABLES CREATION\n")
-                f.write(f"-- Generated: {datetime.now().isoformat()}\n\n")
-                # Get first 2 SQL statements (companies and survey_responses tables)
-                master_sql = "\n".join(self.all_sql_statements[:2])
-                f.write(master_sql)
-            
-            logger.info(f"✓ Saved master tables SQL to: 00_master_tables.txt")
-        except Exception as e:
-            logger.error(f"✗ Failed to save master SQL file: {e}")
-    
     def save_companies_sql_file(self):
         """Save all company INSERT statements to a separate file"""
         try:
-            filepath = os.path.join(self.output_dir, "01_companies_data.txt")
+            filepath = os.path.join(self.output_dir, self.COMPANIES_FILE)
             
             with open(filepath, 'w', encoding='utf-8') as f:
                 f.write("-- COMPANIES DATA\n")
@@ -470,6 +891,53 @@ VALUES ({company_id}, '{company_name.replace("'", "''")}', '{normalized}');\n\n"
         except Exception as e:
             logger.error(f"✗ Failed to save companies SQL file: {e}")
     
+    def save_companies_copy_file(self) -> CopyStreamWriter:
+        """Write all companies as a COPY data file"""
+        filepath = os.path.join(self.output_dir, self.COPY_COMPANIES_FILE)
+        with CopyStreamWriter(filepath, 'companies', self.COMPANY_COLUMNS) as writer:
+            for normalized, company_info in sorted(self.company_registry.items(), key=lambda x: x[1]['id']):
+                writer.add((company_info['id'], str(company_info['original_name']), normalized))
+        
+        logger.info(f"✓ Saved companies COPY data to: {self.COPY_COMPANIES_FILE} ({writer.row_count} companies)")
+        return writer
+    
+    def save_copy_manifest(self, writers: List[CopyStreamWriter]):
+        """Write the manifest listing the DDL file and each COPY file in load order"""
+        manifest = {
+            'generated': datetime.now().isoformat(),
+            'format': 'text',
+            'null': '\\N',
+            'ddl': self.MASTER_FILE,
+            'tables': [writer.manifest_entry() for writer in writers]
+        }
+        filepath = os.path.join(self.output_dir, self.COPY_MANIFEST_FILE)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        
+        logger.info(f"✓ Saved COPY manifest to: {self.COPY_MANIFEST_FILE}")
+    
+    def export_copy_files(self):
+        """Process every year straight into COPY data files, then write companies and the manifest"""
+        responses = CopyStreamWriter(os.path.join(self.output_dir, self.COPY_RESPONSES_FILE),
+                                     'survey_responses', self.RESPONSE_COLUMNS, self.compress)
+        answers = CopyStreamWriter(os.path.join(self.output_dir, self.COPY_ANSWERS_FILE),
+                                   self.ANSWERS_TABLE, self.ANSWER_COLUMNS, self.compress)
+        self.registration_rows, self.answer_rows = responses, answers
+        with responses, answers:
+            self.process_all_years()
+        logger.info(f"✓ Saved COPY data: {responses.row_count} responses, {answers.row_count} answers")
+        
+        companies = self.save_companies_copy_file()
+        self.save_copy_manifest([companies, responses, answers])
+    
+    def save_company_merges_file(self):
+        """Write the fuzzy merges that were applied, for manual review"""
+        filepath = os.path.join(self.output_dir, self.COMPANY_MERGES_FILE)
+        merges = pd.DataFrame(self.company_matcher.merges, columns=['normalized_name', 'merged_into', 'score'])
+        merges['score'] = merges['score'].round(3)
+        merges.to_csv(filepath, index=False)
+        logger.info(f"✓ Saved {len(merges)} fuzzy company merges to: {self.COMPANY_MERGES_FILE}")
+    
     def migrate_all(self):
         """Run complete migration for all survey years"""
         try:
@@ -482,32 +950,44 @@ VALUES ({company_id}, '{company_name.replace("'", "''")}', '{normalized}');\n\n"
             # Create master tables
             self.create_master_tables()
             
-            # Save master tables SQL
-            self.save_master_sql_file()
-            
-            # Process each survey year
-            for year in sorted(self.SURVEY_CONFIGS.keys()):
-                self.process_survey_year(year)
-            
-            # Generate company INSERT statements
-            self.save_companies_sql_file()
+            if self.output_format == self.FORMAT_COPY:
+                self.export_copy_files()
+            else:
+                # Process each survey year, streaming response SQL straight to disk
+                responses_path = os.path.join(self.output_dir, self.RESPONSES_FILE)
+                with SqlStreamWriter(responses_path, "SURVEY RESPONSES DATA", self.compress) as self.writer:
+                    self.process_all_years()
+                self.writer = None
+                logger.info(f"✓ Saved survey responses SQL to: {os.path.basename(responses_path)}")
+                
+                # Generate company INSERT statements
+                self.save_companies_sql_file()
             
-            # Save all response SQL to one file
-            self.save_all_responses_sql_file()
+            if self.company_matcher:
+                self.save_company_merges_file()
             
             logger.info("\n" + "="*80)
             logger.info("SQL GENERATION COMPLETE")
             logger.info("="*80)
             logger.info(f"Total companies: {len(self.company_registry)}")
             logger.info(f"Output directory: {self.output_dir}")
-            logger.info(f"Total SQL statements: {len(self.all_sql_statements)}")
-            logger.info("="*80)
-            logger.info("\nNext steps:")
-            logger.info("1. Review the generated SQL files in the output directory")
-            logger.info("2. Run combine_sql_files.py to create COMBINED_MIGRATION.sql")
-            logger.info("3. Run execute_migration_supabase.py to create batch files")
-            logger.info("4. Execute batches in Supabase SQL Editor")
-            logger.info("="*80)
+            if self.output_format == self.FORMAT_COPY:
+                logger.info(f"Total SQL statements: {self.total_statements}")
+                logger.info("="*80)
+                logger.info("\nNext steps:")
+                logger.info(f"1. Run {self.MASTER_FILE} to create the tables")
+                logger.info(f"2. Load each file listed in {self.COPY_MANIFEST_FILE} in order, e.g.")
+                logger.info("   psql -c \"COPY companies (...) FROM STDIN\" < 01_companies.tsv")
+                logger.info("="*80)
+            else:
+                logger.info(f"Total SQL statements: {self.total_statements + len(self.company_registry)}")
+                logger.info("="*80)
+                logger.info("\nNext steps:")
+                logger.info("1. Review the generated SQL files in the output directory")
+                logger.info("2. Run combine_sql_files.py to create COMBINED_MIGRATION.sql")
+                logger.info("3. Run execute_migration_supabase.py to create batch files")
+                logger.info("4. Execute batches in Supabase SQL Editor")
+                logger.info("="*80)
             
         except Exception as e:
             logger.error(f"✗ Migration failed: {e}")
@@ -519,11 +999,29 @@ VALUES ({company_id}, '{company_name.replace("'", "''")}', '{normalized}');\n\n"
 def main():
     """Main execution function"""
     
+    parser = argparse.ArgumentParser(description="Generate survey migration SQL")
+    parser.add_argument('--gzip', action='store_true', help="Compress the survey responses data file(s)")
+    parser.add_argument('--layout', choices=[DynamicSurveyMigrator.LAYOUT_TABLES, DynamicSurveyMigrator.LAYOUT_LONG],
+                        default=DynamicSurveyMigrator.LAYOUT_TABLES,
+                        help="One table per response, or one shared long-format survey_answers table")
+    parser.add_argument('--format', dest='output_format',
+                        choices=[DynamicSurveyMigrator.FORMAT_SQL, DynamicSurveyMigrator.FORMAT_COPY],
+                        default=DynamicSurveyMigrator.FORMAT_SQL,
+                        help="SQL statements, or COPY data files plus copy_manifest.json (implies --layout long)")
+    parser.add_argument('--match-companies', dest='match_threshold', type=float, metavar='THRESHOLD',
+                        help="Merge near-duplicate company names at this Jaro-Winkler similarity (e.g. 0.90)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Process survey years in this many worker processes (output matches --workers 1)")
+    args = parser.parse_args()
+    
     # Output directory
     output_dir = r"C:\Users\almul\Downloads\Migration TXTs"
     
     # Create migrator
-    migrator = DynamicSurveyMigrator(output_dir=output_dir)
+    migrator = DynamicSurveyMigrator(output_dir=output_dir, compress=args.gzip, layout=args.layout,
+                                     output_format=args.output_format,
+                                     company_match_threshold=args.match_threshold,
+                                     workers=args.workers)
     
     # Run migration
     try:
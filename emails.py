@@ -1,5 +1,7 @@
 import pandas as pd
 
+from excel_cache import read_excel_cached, excel_columns
+
 # List of file paths
 file_paths = [
     r"C:\Users\almul\Downloads\CFF2024.xlsx",
@@ -14,8 +16,8 @@ all_emails = []
 # Process each file
 for file_path in file_paths:
     try:
-        # Read the Excel file
-        df = pd.read_excel(file_path)
+        # Read the Excel file (only the column we need, from the cache after the first run)
+        df = read_excel_cached(file_path, columns=['Email'])
         
         # Check if 'Email' column exists
         if 'Email' in df.columns:
@@ -25,7 +27,7 @@ for file_path in file_paths:
             print(f"✓ Processed {file_path}: Found {len(emails)} emails")
         else:
             print(f"⚠ Warning: 'Email' column not found in {file_path}")
-            print(f"  Available columns: {', '.join(df.columns)}")
+            print(f"  Available columns: {', '.join(excel_columns(file_path))}")
     
     except FileNotFoundError:
         print(f"✗ Error: File not found - {file_path}")
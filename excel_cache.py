@@ -0,0 +1,207 @@
+"""
+CACHED EXCEL LOADER
+Parses each survey workbook with openpyxl once and keeps a Parquet sidecar
+(pickle when pyarrow is not installed or a sheet does not round-trip through
+Parquet). Later runs load the sidecar instead of re-parsing the workbook.
+
+Sidecars are keyed by the workbook's SHA-256; the recorded mtime and size
+let unchanged files skip hashing. They live in a .excel_cache folder next to
+the workbook, or in EXCEL_CACHE_DIR when that is set.
+
+Usage:
+    from excel_cache import read_excel_cached, excel_columns
+    df = read_excel_cached(path)                        # first sheet, all columns
+    df = read_excel_cached(path, columns=['Email'])     # only these columns
+    excel_columns(path)                                 # header names, from the cache
+    chunks = iter_cached_chunks(path, chunk_size=500)   # row-dict lists from a fresh Parquet
+    if chunks is None: ...                              # sidecar, or None (stream the xlsx instead)
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401  (enables Parquet sidecars)
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+CACHE_DIR_ENV = 'EXCEL_CACHE_DIR'
+
+# Rows per Parquet row group: iter_cached_chunks decodes one group at a time
+SIDECAR_ROW_GROUP_SIZE = 5000
+
+
+def _file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_paths(file_path: str, sheet_name: Any, read_kwargs: Dict[str, Any]) -> Dict[str, str]:
+    """Cache folder and metadata file for one (workbook, sheet, read options) combination"""
+    cache_dir = os.getenv(CACHE_DIR_ENV) or os.path.join(os.path.dirname(file_path), '.excel_cache')
+    key = hashlib.sha1(repr((file_path, sheet_name, sorted(read_kwargs.items()))).encode('utf-8')).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return {'dir': cache_dir, 'meta': os.path.join(cache_dir, f"{stem}-{key}.json"), 'prefix': f"{stem}-{key}"}
+
+
+def _restore_missing(df: pd.DataFrame) -> pd.DataFrame:
+    """Parquet brings object-column gaps back as None; read_excel gives NaN"""
+    for column in df.columns[df.dtypes == object]:
+        series = df[column]
+        if series.isna().any():
+            df[column] = series.where(series.notna(), np.nan)
+    return df
+
+
+def _write_sidecar(df: pd.DataFrame, base_path: str) -> str:
+    """Write df next to base_path; returns the sidecar path"""
+    if HAS_PYARROW and all(isinstance(column, str) for column in df.columns):
+        path = base_path + '.parquet'
+        try:
+            df.to_parquet(path, index=True, row_group_size=SIDECAR_ROW_GROUP_SIZE)
+            if _restore_missing(pd.read_parquet(path)).equals(df):
+                return path
+        except Exception as e:
+            logger.debug(f"Parquet sidecar not usable for {base_path}: {e}")
+        if os.path.exists(path):
+            os.remove(path)
+    path = base_path + '.pkl'
+    df.to_pickle(path)
+    return path
+
+
+def _read_sidecar(meta: Dict[str, Any], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load a sidecar, optionally only the requested columns that exist in the sheet"""
+    path = meta['sidecar']
+    if path.endswith('.parquet'):
+        if columns is not None:
+            available = set(meta['columns'])
+            columns = [c for c in columns if c in available]
+        return _restore_missing(pd.read_parquet(path, columns=columns))
+    df = pd.read_pickle(path)
+    return df[[c for c in columns if c in df.columns]] if columns is not None else df
+
+
+def _load_meta(meta_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _fresh_meta(file_path: str, sheet_name: Any, read_kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Metadata of the sidecar if it matches the workbook as it is now, else None"""
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    paths = _cache_paths(file_path, sheet_name, read_kwargs)
+    meta = _load_meta(paths['meta'])
+
+    if meta and os.path.exists(meta['sidecar']) and meta['size'] == stat.st_size:
+        if meta['mtime'] == stat.st_mtime:
+            return meta
+        # Touched but possibly unchanged: compare contents before re-parsing
+        if _file_sha256(file_path) == meta['sha256']:
+            meta['mtime'] = stat.st_mtime
+            with open(paths['meta'], 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2)
+            return meta
+    return None
+
+
+def _cached_meta(file_path: str, sheet_name: Any, read_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata of an up-to-date sidecar, parsing the workbook and writing one if needed"""
+    meta = _fresh_meta(file_path, sheet_name, read_kwargs)
+    if meta:
+        return meta
+
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    paths = _cache_paths(file_path, sheet_name, read_kwargs)
+    meta = _load_meta(paths['meta'])
+    sha256 = _file_sha256(file_path)
+    logger.info(f"Parsing {os.path.basename(file_path)} (no up-to-date cache)")
+    df = pd.read_excel(file_path, sheet_name=sheet_name, **read_kwargs)
+
+    os.makedirs(paths['dir'], exist_ok=True)
+    if meta and os.path.exists(meta.get('sidecar', '')):
+        os.remove(meta['sidecar'])
+    sidecar = _write_sidecar(df, os.path.join(paths['dir'], f"{paths['prefix']}-{sha256[:16]}"))
+    meta = {
+        'source': file_path,
+        'sheet_name': sheet_name,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'sha256': sha256,
+        'sidecar': sidecar,
+        'columns': [str(column) for column in df.columns]
+    }
+    with open(paths['meta'], 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def read_excel_cached(file_path: str, sheet_name: Any = 0, columns: Optional[List[str]] = None,
+                      **read_kwargs) -> pd.DataFrame:
+    """
+    pd.read_excel(file_path, sheet_name, **read_kwargs) served from a sidecar cache.
+    columns: load only these columns (those missing from the sheet are left out).
+    Falls back to a plain read_excel if the cache cannot be written.
+    """
+    try:
+        meta = _cached_meta(file_path, sheet_name, read_kwargs)
+    except OSError as e:
+        if not os.path.exists(file_path):
+            raise
+        logger.warning(f"Excel cache unavailable for {file_path}: {e}")
+        df = pd.read_excel(file_path, sheet_name=sheet_name, **read_kwargs)
+        return df[[c for c in columns if c in df.columns]] if columns is not None else df
+
+    return _read_sidecar(meta, columns)
+
+
+def excel_columns(file_path: str, sheet_name: Any = 0, **read_kwargs) -> List[str]:
+    """Header names of a sheet, without loading its data once the cache exists"""
+    return _cached_meta(file_path, sheet_name, read_kwargs)['columns']
+
+
+def iter_cached_chunks(file_path: str, sheet_name: Any = 0, columns: Optional[List[str]] = None,
+                       chunk_size: int = 500, **read_kwargs) -> Optional[Iterator[List[Dict[str, Any]]]]:
+    """
+    Rows of an up-to-date Parquet sidecar as lists of up to chunk_size row
+    dicts (empty cells are None), decoded one row group at a time. None when
+    there is no such sidecar: the caller streams the workbook instead, since
+    parsing it here would load the whole sheet.
+    """
+    try:
+        meta = _fresh_meta(file_path, sheet_name, read_kwargs)
+    except OSError:
+        return None
+    if not meta or not meta['sidecar'].endswith('.parquet'):
+        return None
+
+    import pyarrow.parquet as pq
+    available = meta['columns']
+    if columns is not None:
+        wanted = set(columns)
+        available = [c for c in available if c in wanted]
+
+    def chunks():
+        parquet_file = pq.ParquetFile(meta['sidecar'])
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=available):
+            chunk = batch.to_pandas().astype(object)
+            yield chunk.where(chunk.notna(), None).to_dict('records')
+
+    return chunks()
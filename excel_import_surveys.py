@@ -34,6 +34,9 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 import traceback
 
+from auth_directory import AuthUserDirectory
+from user_provisioning import UserProvisioner, STATUS_CREATED
+
 # Load environment variables
 load_dotenv()
 
@@ -47,6 +50,8 @@ class SurveyImporter:
             raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in .env file")
         
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        self.provisioner = UserProvisioner(self.supabase_url, self.supabase_key)
+        self.directory = AuthUserDirectory.for_client(self.supabase)
         
         # Statistics
         self.stats = {
@@ -76,14 +81,11 @@ class SurveyImporter:
         Returns user_id (UUID) or None if failed
         """
         try:
-            # Check if user exists
-            response = self.supabase.auth.admin.list_users()
-            existing_users = response if isinstance(response, list) else []
-            
-            for user in existing_users:
-                if user.email and user.email.lower() == email.lower():
-                    self.stats['users_existing'] += 1
-                    return user.id
+            # Check if user exists (all auth users are indexed once, case-insensitively)
+            user_id = self.directory.get(email)
+            if user_id:
+                self.stats['users_existing'] += 1
+                return user_id
             
             # User doesn't exist, create new one
             # Split name into first and last
@@ -92,18 +94,18 @@ class SurveyImporter:
             last_name = name_parts[1] if len(name_parts) > 1 else ''
             
             # Create user with Supabase Admin API
-            new_user = self.supabase.auth.admin.create_user({
-                'email': email,
-                'email_confirm': True,
-                'user_metadata': {
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'role_title': role_title
-                }
+            result = self.provisioner.create_user(email, user_metadata={
+                'first_name': first_name,
+                'last_name': last_name,
+                'role_title': role_title
             })
             
-            if new_user and hasattr(new_user, 'user'):
-                user_id = new_user.user.id
+            if result['status'] != STATUS_CREATED:
+                raise Exception(result['error'] or 'User already registered')
+            
+            if result['user_id']:
+                user_id = result['user_id']
+                self.directory.add(email, user_id)
                 self.stats['users_created'] += 1
                 print(f"✓ Created user: {email}")
                 
@@ -0,0 +1,113 @@
+"""
+STREAMING EXCEL ROW SOURCE
+Reads a survey sheet with openpyxl in read-only mode and yields rows as
+dicts keyed by column header, a chunk at a time. The first rows are handed
+out while the rest of the workbook is still being parsed, and memory stays
+flat however many responses the export holds.
+
+Headers follow pd.read_excel: blank headers become "Unnamed: <n>" and
+repeated headers get ".1", ".2", ... suffixes. Empty cells are None and
+trailing blank rows are dropped.
+
+Usage:
+    from excel_stream import ExcelRowSource
+    source = ExcelRowSource(path, chunk_size=500)
+    source.columns                          # header names
+    for idx, row in source:                 # 0-based data row index, row dict
+        ...
+    for chunk in source.iter_chunks():      # [row dict, ...] of up to chunk_size rows
+        ...
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from openpyxl import load_workbook
+
+
+def _header_names(values: Tuple[Any, ...]) -> List[Any]:
+    """Column names for a header row, de-duplicated the way pandas does"""
+    names: List[Any] = []
+    seen: Dict[Any, int] = {}
+    for position, value in enumerate(values):
+        name = f"Unnamed: {position}" if value is None or value == '' else value
+        if name in seen:
+            base = name
+            while name in seen:
+                seen[base] += 1
+                name = f"{base}.{seen[base]}"
+        seen[name] = 0
+        names.append(name)
+    return names
+
+
+class ExcelRowSource:
+    """Row dicts of one worksheet, streamed from a read-only workbook"""
+
+    def __init__(self, file_path: str, sheet_name: Any = 0, chunk_size: int = 500):
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        self.chunk_size = chunk_size
+        self._columns: Optional[List[Any]] = None
+        self.rows_hint: Optional[int] = None
+
+    def _open_sheet(self):
+        workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+        if isinstance(self.sheet_name, int):
+            sheet = workbook.worksheets[self.sheet_name]
+        else:
+            sheet = workbook[self.sheet_name]
+        # Dimensions recorded by the exporting tool are only an estimate: use them
+        # for progress output, but iterate until the data really ends
+        if sheet.max_row:
+            self.rows_hint = max(0, sheet.max_row - 1)
+        sheet.reset_dimensions()
+        return workbook, sheet
+
+    @property
+    def columns(self) -> List[Any]:
+        """Header names (reads only the first row of the sheet)"""
+        if self._columns is None:
+            workbook, sheet = self._open_sheet()
+            try:
+                header = next(sheet.iter_rows(values_only=True), ())
+                self._columns = _header_names(header)
+            finally:
+                workbook.close()
+        return self._columns
+
+    def __iter__(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(0-based data row index, row dict) for every data row"""
+        workbook, sheet = self._open_sheet()
+        try:
+            rows = sheet.iter_rows(values_only=True)
+            self._columns = columns = _header_names(next(rows, ()))
+            width = len(columns)
+            position = 0
+            blank_run = 0
+            for values in rows:
+                if all(value is None or value == '' for value in values):
+                    # Only emitted if data follows (pandas keeps inner blank rows, drops trailing ones)
+                    blank_run += 1
+                    continue
+                for _ in range(blank_run):
+                    yield position, dict.fromkeys(columns)
+                    position += 1
+                blank_run = 0
+
+                if len(values) < width:
+                    values = values + (None,) * (width - len(values))
+                yield position, dict(zip(columns, values))
+                position += 1
+        finally:
+            workbook.close()
+
+    def iter_chunks(self) -> Iterator[List[Dict[str, Any]]]:
+        """Rows in lists of up to chunk_size"""
+        chunk: List[Dict[str, Any]] = []
+        for _, row in self:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
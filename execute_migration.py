@@ -1,25 +1,181 @@
 """
 SQL MIGRATION EXECUTOR
 Connects to PostgreSQL database and executes the combined migration SQL file
-Handles large files by executing statements in batches
+Streams the file statement by statement (quotes, dollar quoting and comments
+are respected, so ';' inside answer text is safe) and sends several
+statements per server round trip, committing once per batch
 
-Run: python execute_migration.py
+After every batch a checkpoint (<sql file>.checkpoint.json) records how many
+statements are done and the file's SHA-256; --resume continues from there.
+
+Failures never wait for input. --on-error picks the policy:
+- continue (default): every round trip runs under a SAVEPOINT; a failing one is
+  rolled back to it and bisected, so only the failing statements are lost
+- skip-batch: roll the whole batch back and dead-letter all of it
+- abort: roll the batch back and stop (rerun with --resume)
+Dead-lettered statements are written in full, with their error, to
+<sql file>.failed.sql, which can itself be run with --file.
+
+Run: python execute_migration.py [--file COMBINED_MIGRATION.sql] [--resume]
+                                 [--on-error continue|skip-batch|abort] [--max-errors N]
 """
 
 import psycopg2
 import os
+import json
+import hashlib
+import argparse
 from datetime import datetime
-import re
+from itertools import islice
+from typing import List, Tuple
 from dotenv import load_dotenv
 
+from sql_statements import iter_sql_statements, group_statements, join_statements, terminate
+
 # Load environment variables
 load_dotenv()
 
-def execute_sql_file():
-    """Execute SQL file against PostgreSQL database"""
+# Configuration
+SQL_FILE = r"C:\Users\almul\Downloads\Migration TXTs\COMBINED_MIGRATION.sql"
+
+# Statements per transaction (one commit each)
+BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', '1000'))
+
+# Statements / bytes sent to the server in one cursor.execute() round trip
+ROUND_TRIP_STATEMENTS = int(os.getenv('MIGRATION_ROUND_TRIP_STATEMENTS', '200'))
+ROUND_TRIP_BYTES = 1024 * 1024
+
+# What to do with a batch that contains a failing statement
+ERROR_CONTINUE = 'continue'
+ERROR_SKIP_BATCH = 'skip-batch'
+ERROR_ABORT = 'abort'
+ERROR_POLICIES = (ERROR_CONTINUE, ERROR_SKIP_BATCH, ERROR_ABORT)
+
+# Savepoint wrapped around each round trip under --on-error continue
+SAVEPOINT_NAME = 'migration_round_trip'
+
+
+class MigrationAborted(Exception):
+    """Raised to stop the run under --on-error abort or --max-errors"""
+
+
+class DeadLetterWriter:
+    """Appends failed statements, with their errors, to a replayable .sql file"""
+    
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.file = None
+        self.count = 0
+    
+    def write(self, statement_number: int, batch_num: int, statement: str, error: str):
+        if self.file is None:
+            self.file = open(self.filepath, 'a', encoding='utf-8')
+        self.file.write(f"-- Statement {statement_number} (batch {batch_num}) failed:\n")
+        for line in error.splitlines():
+            self.file.write(f"--   {line}\n")
+        self.file.write(terminate(statement))
+        self.file.write("\n\n")
+        self.file.flush()
+        self.count += 1
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in 1 MB chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checkpoint_path(sql_file: str) -> str:
+    return sql_file + '.checkpoint.json'
+
+
+def load_checkpoint(sql_file: str):
+    """Saved checkpoint for sql_file, or None"""
+    try:
+        with open(checkpoint_path(sql_file), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(sql_file: str, checkpoint: dict):
+    """Write the checkpoint atomically, so a crash never leaves half a file"""
+    checkpoint['updated_at'] = datetime.now().isoformat()
+    path = checkpoint_path(sql_file)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def dead_letter_path(sql_file: str) -> str:
+    return sql_file + '.failed.sql'
+
+
+def execute_grouped(cursor, statements: List[str]):
+    """Run statements with several per round trip"""
+    for group in group_statements(statements, ROUND_TRIP_STATEMENTS, ROUND_TRIP_BYTES):
+        cursor.execute(join_statements(group))
+
+
+def execute_savepoint_group(cursor, group: List[str], position: int, failures: List[Tuple[int, str]]):
+    """
+    Run a group in one round trip under a savepoint. If it fails, roll back to
+    the savepoint (earlier work in the transaction is kept) and bisect the
+    group until the failing statements are isolated.
+    """
+    try:
+        cursor.execute(f"SAVEPOINT {SAVEPOINT_NAME};\n{join_statements(group)}\nRELEASE SAVEPOINT {SAVEPOINT_NAME};")
+        return
+    except psycopg2.Error as e:
+        cursor.execute(f"ROLLBACK TO SAVEPOINT {SAVEPOINT_NAME}; RELEASE SAVEPOINT {SAVEPOINT_NAME};")
+        if len(group) == 1:
+            failures.append((position, str(e).strip()))
+            return
     
-    # Configuration
-    sql_file = r"C:\Users\almul\Downloads\Migration TXTs\COMBINED_MIGRATION.sql"
+    middle = len(group) // 2
+    execute_savepoint_group(cursor, group[:middle], position, failures)
+    execute_savepoint_group(cursor, group[middle:], position + middle, failures)
+
+
+def execute_isolated(cursor, batch: List[str]) -> List[Tuple[int, str]]:
+    """
+    Run a batch with several statements per round trip, isolating failures with
+    savepoints. Returns (position, error) per failing statement; the caller
+    commits the rest.
+    """
+    failures: List[Tuple[int, str]] = []
+    position = 0
+    for group in group_statements(batch, ROUND_TRIP_STATEMENTS, ROUND_TRIP_BYTES):
+        execute_savepoint_group(cursor, group, position, failures)
+        position += len(group)
+    return failures
+
+
+def batched(statements, size):
+    """Lists of up to size statements from an iterator"""
+    while True:
+        batch = list(islice(statements, size))
+        if not batch:
+            return
+        yield batch
+
+
+def execute_sql_file(sql_file: str = SQL_FILE, resume: bool = False,
+                     on_error: str = ERROR_CONTINUE, max_errors: int = 0):
+    """
+    Execute SQL file against PostgreSQL database.
+    resume: continue after the last checkpoint.
+    on_error: one of ERROR_POLICIES.
+    max_errors: stop once more statements than this have failed (0 = no limit).
+    """
     
     # Get database password from environment or prompt
     db_password = os.getenv('SUPABASE_DB_PASSWORD')
@@ -39,6 +195,7 @@ def execute_sql_file():
     print("="*80)
     print(f"SQL File: {sql_file}")
     print(f"Database: {db_host}")
+    print(f"On error: {on_error}" + (f" (stop after {max_errors} failed statements)" if max_errors else ""))
     print("="*80)
     
     # Check if SQL file exists
@@ -50,36 +207,43 @@ def execute_sql_file():
     file_size = os.path.getsize(sql_file)
     print(f"\n📁 SQL file size: {file_size:,} bytes ({file_size / 1024 / 1024:.2f} MB)")
     
-    # Read SQL file
-    print("\n📖 Reading SQL file...")
-    try:
-        with open(sql_file, 'r', encoding='utf-8') as f:
-            sql_content = f.read()
-    except Exception as e:
-        print(f"❌ Error reading SQL file: {e}")
-        return
-    
-    # Split into individual statements
-    print("🔪 Splitting SQL statements...")
-    
-    # Remove comment-only lines but keep inline comments
-    lines = sql_content.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        # Skip lines that are only comments or separators
-        if line.strip().startswith('--') or line.strip().startswith('='):
-            continue
-        cleaned_lines.append(line)
-    
-    cleaned_content = '\n'.join(cleaned_lines)
-    
-    # Split by semicolon (statements end with ;)
-    statements = cleaned_content.split(';')
+    # The checkpoint is only valid for the exact file it was written for
+    sha256 = file_sha256(sql_file)
+    checkpoint = load_checkpoint(sql_file)
+    if resume and checkpoint:
+        if checkpoint.get('sha256') != sha256:
+            print(f"❌ Error: {sql_file} changed since the checkpoint was written")
+            print(f"   Delete {checkpoint_path(sql_file)} or run without --resume")
+            return
+        if checkpoint.get('completed'):
+            print("\n✓ Checkpoint says this migration already completed; nothing to do")
+            return
+        print(f"\n⏩ Resuming after batch {checkpoint['batches_done']} "
+              f"({checkpoint['statements_done']:,} statements already done)")
+    else:
+        if resume:
+            print("\n⚠️  No checkpoint found; starting from the first statement")
+        elif checkpoint and not checkpoint.get('completed'):
+            print("\n⚠️  Replacing the unfinished checkpoint (use --resume to continue it)")
+        checkpoint = {
+            'sql_file': sql_file,
+            'sha256': sha256,
+            'batches_done': 0,
+            'statements_done': 0,
+            'statements_executed': 0,
+            'statements_failed': 0,
+            'completed': False
+        }
+        # Failures of an earlier, abandoned run are not part of this one
+        if os.path.exists(dead_letter_path(sql_file)):
+            os.remove(dead_letter_path(sql_file))
+    dead_letter = DeadLetterWriter(dead_letter_path(sql_file))
     
-    # Clean up statements
-    statements = [stmt.strip() for stmt in statements if stmt.strip() and len(stmt.strip()) > 10]
-    
-    print(f"✓ Found {len(statements)} SQL statements to execute")
+    # Statements are read lazily while executing; nothing is split up front.
+    # Already checkpointed statements are only tokenized, never re-executed.
+    statements = iter_sql_statements(sql_file)
+    for _ in islice(statements, checkpoint['statements_done']):
+        pass
     
     # Connect to database
     print("\n🔌 Connecting to database...")
@@ -104,55 +268,74 @@ def execute_sql_file():
     
     executed = 0
     failed = 0
-    batch_size = 100
-    total_batches = (len(statements) + batch_size - 1) // batch_size
+    batch_num = checkpoint['batches_done']
+    started = datetime.now()
     
     try:
-        for i in range(0, len(statements), batch_size):
-            batch = statements[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            
-            print(f"\n📦 Batch {batch_num}/{total_batches} ({len(batch)} statements)")
+        for batch in batched(statements, BATCH_SIZE):
+            batch_num += 1
+            print(f"\n📦 Batch {batch_num} ({len(batch)} statements)")
             
-            for j, statement in enumerate(batch, 1):
-                try:
-                    # Skip empty statements
-                    if not statement or len(statement) < 10:
-                        continue
-                    
-                    # Execute statement
-                    cursor.execute(statement)
-                    executed += 1
-                    
-                    # Show progress every 10 statements
-                    if j % 10 == 0:
-                        print(f"  ✓ Executed {executed}/{len(statements)} statements")
-                    
-                except Exception as e:
-                    failed += 1
-                    error_msg = str(e)
-                    # Show first 100 chars of statement
-                    stmt_preview = statement[:100] + "..." if len(statement) > 100 else statement
-                    print(f"  ⚠️  Error in statement {executed + failed}: {error_msg}")
-                    print(f"     Statement: {stmt_preview}")
-                    
-                    # Ask user if they want to continue
-                    if failed > 10:
-                        response = input("\n⚠️  More than 10 errors. Continue? (y/n): ")
-                        if response.lower() != 'y':
-                            raise Exception("Migration aborted by user")
+            try:
+                # Several statements per round trip instead of one execute() each
+                if on_error == ERROR_CONTINUE:
+                    failures = execute_isolated(cursor, batch)
+                else:
+                    execute_grouped(cursor, batch)
+                    failures = []
+            except psycopg2.Error as e:
+                # The transaction is aborted: nothing in this batch was applied
+                conn.rollback()
+                error = str(e).strip()
+                print(f"  ⚠️  Error in batch {batch_num}: {error}")
+                if on_error != ERROR_SKIP_BATCH:
+                    raise MigrationAborted(f"batch {batch_num} failed ({on_error})")
+                failures = [(position, f"batch rolled back: {error}") for position in range(len(batch))]
             
-            # Commit batch
+            # Commit batch (everything except the failing statements)
             conn.commit()
-            print(f"  ✓ Batch {batch_num} committed successfully")
+            batch_start = checkpoint['statements_done']
+            for position, error in failures:
+                dead_letter.write(batch_start + position + 1, batch_num, batch[position], error)
+                if on_error == ERROR_CONTINUE:
+                    print(f"  ⚠️  Statement {batch_start + position + 1}: {error.splitlines()[0]}")
+            batch_failed = len(failures)
+            executed += len(batch) - batch_failed
+            failed += batch_failed
+            if batch_failed:
+                print(f"  ⚠️  Batch {batch_num}: {batch_failed} failed statement(s) written to {dead_letter.filepath}")
+            if batch_failed < len(batch):
+                print(f"  ✓ Batch {batch_num} committed successfully ({executed:,} statements so far)")
+            
+            # This batch is settled (committed, or rolled back and skipped). A crash
+            # between the commit and this write re-runs at most this one batch.
+            checkpoint['batches_done'] = batch_num
+            checkpoint['statements_done'] += len(batch)
+            checkpoint['statements_executed'] += len(batch) - batch_failed
+            checkpoint['statements_failed'] += batch_failed
+            save_checkpoint(sql_file, checkpoint)
+            
+            if max_errors and failed > max_errors:
+                raise MigrationAborted(f"{failed} statements failed (--max-errors {max_errors})")
+        
+        checkpoint['completed'] = True
+        save_checkpoint(sql_file, checkpoint)
         
+        total = executed + failed
+        elapsed = (datetime.now() - started).total_seconds()
         print("\n" + "="*80)
         print("✅ MIGRATION COMPLETE!")
         print("="*80)
-        print(f"Total statements: {len(statements)}")
+        print(f"Total statements: {total}")
         print(f"Successfully executed: {executed}")
         print(f"Failed: {failed}")
-        print(f"Success rate: {(executed / len(statements) * 100):.2f}%")
+        print(f"Success rate: {(executed / total * 100) if total else 100:.2f}%")
+        if dead_letter.count:
+            print(f"Failed statements: {dead_letter.filepath}")
+        print(f"Elapsed: {elapsed:.1f}s")
+        if checkpoint['statements_done'] > total:
+            print(f"Including earlier runs: {checkpoint['statements_executed']:,} executed, "
+                  f"{checkpoint['statements_failed']:,} failed")
         print("="*80)
         
     except Exception as e:
@@ -160,10 +343,25 @@ def execute_sql_file():
         print("Rolling back transaction...")
         conn.rollback()
         print("✓ Rollback complete")
+        print(f"Run again with --resume to continue after batch {checkpoint['batches_done']}")
     finally:
+        dead_letter.close()
         cursor.close()
         conn.close()
         print("\n🔌 Database connection closed")
 
+def main():
+    """Parse command line arguments and run the migration"""
+    parser = argparse.ArgumentParser(description="Execute a migration SQL file against PostgreSQL")
+    parser.add_argument('--file', dest='sql_file', default=SQL_FILE, help="SQL file to execute")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip the statements recorded in the checkpoint of a previous run")
+    parser.add_argument('--on-error', choices=ERROR_POLICIES, default=ERROR_CONTINUE,
+                        help="continue past failing statements, skip their whole batch, or abort")
+    parser.add_argument('--max-errors', type=int, default=0,
+                        help="Abort once more than this many statements have failed (default: no limit)")
+    args = parser.parse_args()
+    execute_sql_file(args.sql_file, resume=args.resume, on_error=args.on_error, max_errors=args.max_errors)
+
 if __name__ == "__main__":
-    execute_sql_file()
+    main()
@@ -1,122 +1,356 @@
 """
-SQL MIGRATION EXECUTOR (Supabase Client)
-Uses Supabase client library to execute SQL statements via RPC
-Alternative to direct PostgreSQL connection
+SQL MIGRATION EXECUTOR (Supabase)
+Splits the combined migration SQL file into batches and runs them itself,
+instead of leaving batch files to paste into the SQL editor.
 
-Run: python execute_migration_supabase.py
+Backends:
+- postgres: direct connection (--dsn, SUPABASE_DB_URL, or built from SUPABASE_URL
+  and SUPABASE_DB_PASSWORD). A local Postgres DSN stands in for Supabase when testing.
+- rpc: POSTs each batch to the exec_sql function through PostgREST
+  (/rest/v1/rpc/exec_sql, service role key). Create it with CREATE_EXEC_SQL_RPC.sql.
+- files: the old behaviour, batch_XXX_of_YYY.sql files for manual execution.
+
+Batches are cut at --max-statements or --max-bytes, whichever comes first,
+and never between a CREATE TABLE and the inserts that fill that table (unless
+the table alone exceeds a batch). batch_manifest.json in the output directory
+lists every batch with its statement range, size, SHA-256 and outcome.
+
+Each batch runs in its own transaction. Consecutive batches that do not depend
+on each other (plain INSERT ... VALUES into the same existing tables, or
+CREATE TABLE plus inserts into only the tables they create) run concurrently
+on --workers connections; anything else waits for everything before it.
+
+Run: python execute_migration_supabase.py [--backend postgres|rpc|files] [--workers 4]
+                                          [--max-statements 1000] [--max-bytes 1048576]
 """
 
-from supabase import create_client, Client
 import os
+import re
+import json
+import hashlib
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from typing import Dict, FrozenSet, Iterator, List, Optional, Set
+
+import certifi
+import requests
 from dotenv import load_dotenv
 
+from sql_statements import iter_sql_statements, terminate
+
 # Load environment variables
 load_dotenv()
 
-def execute_sql_via_supabase():
-    """Execute SQL file using Supabase client library"""
-    
-    # Configuration
-    sql_file = r"C:\Users\almul\Downloads\Migration TXTs\COMBINED_MIGRATION.sql"
-    
-    # Get Supabase credentials
-    supabase_url = os.getenv('SUPABASE_URL')
-    supabase_key = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-    
-    if not supabase_url or not supabase_key:
-        print("❌ Error: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in .env file")
-        return
-    
-    print("="*80)
-    print("SQL MIGRATION EXECUTOR (Supabase Client)")
-    print("="*80)
-    print(f"SQL File: {sql_file}")
-    print(f"Supabase URL: {supabase_url}")
-    print("="*80)
-    
-    # Check if SQL file exists
-    if not os.path.exists(sql_file):
-        print(f"❌ Error: SQL file not found: {sql_file}")
-        return
-    
-    # Get file size
-    file_size = os.path.getsize(sql_file)
-    print(f"\n📁 SQL file size: {file_size:,} bytes ({file_size / 1024 / 1024:.2f} MB)")
-    
-    # Read SQL file
-    print("\n📖 Reading SQL file...")
-    try:
-        with open(sql_file, 'r', encoding='utf-8') as f:
-            sql_content = f.read()
-    except Exception as e:
-        print(f"❌ Error reading SQL file: {e}")
-        return
-    
-    # Split into individual statements
-    print("🔪 Splitting SQL statements...")
-    
-    # Remove comment-only lines
-    lines = sql_content.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        if line.strip().startswith('--') or line.strip().startswith('='):
+# Configuration
+SQL_FILE = r"C:\Users\almul\Downloads\Migration TXTs\COMBINED_MIGRATION.sql"
+BATCH_OUTPUT_DIR = r"C:\Users\almul\Downloads\Migration TXTs\Batches"
+
+# Batch limits (one transaction / request / SQL editor paste each)
+BATCH_SIZE = 1000
+MAX_BATCH_BYTES = 1024 * 1024
+
+MANIFEST_FILE = 'batch_manifest.json'
+
+BACKEND_POSTGRES = 'postgres'
+BACKEND_RPC = 'rpc'
+BACKEND_FILES = 'files'
+
+# Postgres function the rpc backend calls (see CREATE_EXEC_SQL_RPC.sql)
+RPC_FUNCTION = 'exec_sql'
+
+TABLE_NAME = r'(?:"[^"]+"|[A-Za-z_][\w$]*)(?:\.(?:"[^"]+"|[A-Za-z_][\w$]*))?'
+CREATE_TABLE_PATTERN = re.compile(
+    rf'^CREATE\s+(?:UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?({TABLE_NAME})', re.I)
+CREATE_INDEX_PATTERN = re.compile(
+    rf'^CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(?:{TABLE_NAME}\s+)?ON\s+(?:ONLY\s+)?({TABLE_NAME})', re.I)
+INSERT_VALUES_PATTERN = re.compile(
+    rf'^INSERT\s+INTO\s+({TABLE_NAME})\s*(?:\([^)]*\)\s*)?(?:DEFAULT\s+)?VALUES\b', re.I)
+REFERENCES_PATTERN = re.compile(rf'\bREFERENCES\s+({TABLE_NAME})', re.I)
+PARTITION_OF_PATTERN = re.compile(rf'\bPARTITION\s+OF\s+({TABLE_NAME})', re.I)
+SUBQUERY_PATTERN = re.compile(r'\(\s*SELECT\b', re.I)
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+
+
+def table_key(name: str) -> str:
+    """Comparable table name: unquoted parts lower-cased, default schema dropped"""
+    parts = [part[1:-1] if part.startswith('"') else part.lower()
+             for part in re.findall(r'"[^"]+"|[^.]+', name)]
+    if len(parts) == 2 and parts[0] == 'public':
+        parts = parts[1:]
+    return '.'.join(parts)
+
+
+class BatchProfile:
+    """Which tables a batch creates and inserts into, and whether it can overlap others"""
+
+    def __init__(self, statements: List[str]):
+        self.creates: Set[str] = set()
+        self.inserts: Set[str] = set()
+        self.references: Set[str] = set()
+        # Tables that existed before this batch and are only appended to
+        self.shared: FrozenSet[str] = frozenset()
+        self.barrier = False
+
+        for statement in statements:
+            match = CREATE_TABLE_PATTERN.match(statement)
+            if match:
+                self.creates.add(table_key(match.group(1)))
+                self.references.update(table_key(name) for name in REFERENCES_PATTERN.findall(statement))
+                self.references.update(table_key(name) for name in PARTITION_OF_PATTERN.findall(statement))
+                continue
+            match = CREATE_INDEX_PATTERN.match(statement)
+            if match and table_key(match.group(1)) in self.creates:
+                continue
+            match = INSERT_VALUES_PATTERN.match(statement)
+            # A sub-select reads other tables; answer text such as "(select all that apply)" does not
+            if match and not SUBQUERY_PATTERN.search(STRING_LITERAL_PATTERN.sub("''", statement)):
+                self.inserts.add(table_key(match.group(1)))
+                continue
+            # Anything else (functions, ALTER, UPDATE, INSERT ... SELECT, ...) runs on its own
+            self.barrier = True
+            return
+
+        self.shared = frozenset(self.inserts - self.creates)
+
+
+def statement_size(statement: str) -> int:
+    """Bytes a statement takes in a batch (see batch_sql)"""
+    return len(terminate(statement).encode('utf-8')) + 2
+
+
+def batch_sql(batch: List[str]) -> str:
+    """The SQL text of a batch, as written to its file and sent to the server"""
+    return ''.join(terminate(statement) + '\n\n' for statement in batch)
+
+
+def statement_units(statements) -> Iterator[List[str]]:
+    """Statements that belong together: a CREATE TABLE with the inserts and indexes that follow it for that table"""
+    unit: List[str] = []
+    table = None
+    for statement in statements:
+        match = CREATE_TABLE_PATTERN.match(statement)
+        if match:
+            if unit:
+                yield unit
+            unit = [statement]
+            table = table_key(match.group(1))
             continue
-        cleaned_lines.append(line)
-    
-    cleaned_content = '\n'.join(cleaned_lines)
-    statements = cleaned_content.split(';')
-    statements = [stmt.strip() for stmt in statements if stmt.strip() and len(stmt.strip()) > 10]
-    
-    print(f"✓ Found {len(statements)} SQL statements to execute")
-    
-    # Connect to Supabase
-    print("\n🔌 Connecting to Supabase...")
-    try:
-        supabase: Client = create_client(supabase_url, supabase_key)
-        print("✓ Connected successfully!")
-    except Exception as e:
-        print(f"❌ Error connecting to Supabase: {e}")
-        return
-    
-    # Execute statements using SQL editor
-    print("\n🚀 Executing SQL statements...")
-    print("="*80)
-    print("\n⚠️  Note: Supabase client doesn't support direct SQL execution.")
-    print("We'll need to use the Supabase SQL Editor manually.\n")
-    
-    # Create smaller batch files
+        if table is not None:
+            match = INSERT_VALUES_PATTERN.match(statement) or CREATE_INDEX_PATTERN.match(statement)
+            if match and table_key(match.group(1)) == table:
+                unit.append(statement)
+                continue
+            yield unit
+            unit = []
+            table = None
+        yield [statement]
+    if unit:
+        yield unit
+
+
+def split_batches(statements, max_statements: int = BATCH_SIZE,
+                  max_bytes: int = MAX_BATCH_BYTES) -> Iterator[List[str]]:
+    """
+    Batches of at most max_statements and max_bytes (a single larger statement
+    gets a batch of its own). A batch boundary never falls inside a statement
+    unit, unless the unit alone is larger than a batch.
+    """
+    batch: List[str] = []
+    size = 0
+    for unit in statement_units(statements):
+        sizes = [statement_size(statement) for statement in unit]
+        if batch and (len(batch) + len(unit) > max_statements or size + sum(sizes) > max_bytes):
+            yield batch
+            batch = []
+            size = 0
+        for statement, statement_bytes in zip(unit, sizes):
+            if batch and (len(batch) >= max_statements or size + statement_bytes > max_bytes):
+                yield batch
+                batch = []
+                size = 0
+            batch.append(statement)
+            size += statement_bytes
+    if batch:
+        yield batch
+
+
+def manifest_entry(batch_num: int, first_statement: int, batch: List[str], sql: str) -> Dict:
+    """Manifest record of one batch"""
+    return {
+        'batch': batch_num,
+        'first_statement': first_statement,
+        'last_statement': first_statement + len(batch) - 1,
+        'statements': len(batch),
+        'bytes': len(sql.encode('utf-8')),
+        'sha256': hashlib.sha256(sql.encode('utf-8')).hexdigest()
+    }
+
+
+def save_manifest(output_dir: str, sql_file: str, entries: List[Dict], limits: Dict):
+    """Write batch_manifest.json (batches in order)"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {
+        'sql_file': sql_file,
+        'generated': datetime.now().isoformat(),
+        'limits': limits,
+        'batches': sorted(entries, key=lambda entry: entry['batch'])
+    }
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+class Stage:
+    """A run of consecutive batches that may execute concurrently"""
+
+    def __init__(self):
+        self.profiles: List[BatchProfile] = []
+        self.creates: Set[str] = set()
+        self.references: Set[str] = set()
+        self.shared: Optional[FrozenSet[str]] = None
+
+    def accepts(self, profile: BatchProfile) -> bool:
+        if not self.profiles:
+            return True
+        if profile.barrier or self.profiles[0].barrier:
+            return False
+        return (profile.shared == self.shared
+                and not profile.creates & (self.creates | self.references | self.shared)
+                and not profile.references & self.creates
+                and not profile.shared & self.creates)
+
+    def add(self, profile: BatchProfile):
+        self.profiles.append(profile)
+        if not profile.barrier:
+            self.creates |= profile.creates
+            self.references |= profile.references
+            self.shared = profile.shared
+
+
+class PostgresBackend:
+    """Runs each batch as one transaction on a per-thread psycopg2 connection"""
+
+    def __init__(self, dsn: str):
+        import psycopg2
+        self.psycopg2 = psycopg2
+        self.dsn = dsn
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def describe(self) -> str:
+        masked = re.sub(r'://([^:/@]+):[^@]*@', r'://\1:***@', self.dsn)
+        return re.sub(r'password=\S+', 'password=***', masked)
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or conn.closed:
+            conn = self.psycopg2.connect(self.dsn)
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def execute(self, sql: str):
+        conn = self.connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+
+
+class RpcBackend:
+    """POSTs each batch to a SQL-executing Postgres function through PostgREST"""
+
+    def __init__(self, supabase_url: str, service_key: str, function: str = RPC_FUNCTION):
+        self.url = f"{supabase_url.rstrip('/')}/rest/v1/rpc/{function}"
+        self.headers = {
+            "apikey": service_key,
+            "Authorization": f"Bearer {service_key}",
+            "Content-Type": "application/json"
+        }
+        self.local = threading.local()
+
+    def describe(self) -> str:
+        return self.url
+
+    def execute(self, sql: str):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.verify = certifi.where()
+            self.local.session = session
+        response = session.post(self.url, headers=self.headers, json={'sql': sql}, timeout=600)
+        if response.status_code >= 300:
+            raise RuntimeError(f"{response.status_code} - {response.text}")
+
+    def close(self):
+        pass
+
+
+def default_dsn() -> Optional[str]:
+    """SUPABASE_DB_URL, or the direct connection built from SUPABASE_URL and SUPABASE_DB_PASSWORD"""
+    dsn = os.getenv('SUPABASE_DB_URL')
+    if dsn:
+        return dsn
+    supabase_url = os.getenv('SUPABASE_URL')
+    password = os.getenv('SUPABASE_DB_PASSWORD')
+    match = re.match(r'https?://([^.]+)\.supabase\.co', supabase_url or '')
+    if match and password:
+        return f"host=db.{match.group(1)}.supabase.co port=5432 dbname=postgres user=postgres password={password}"
+    return None
+
+
+def write_batch_files(sql_file: str, output_dir: str, max_statements: int, max_bytes: int):
+    """Write batch_XXX_of_YYY.sql files for manual execution in the SQL editor"""
+    batches = list(split_batches(iter_sql_statements(sql_file), max_statements, max_bytes))
+    total_batches = len(batches)
+    print(f"✓ Found {sum(len(batch) for batch in batches)} SQL statements")
     print("📦 Creating batch files for manual execution...")
-    
-    batch_size = 1000
-    total_batches = (len(statements) + batch_size - 1) // batch_size
-    output_dir = r"C:\Users\almul\Downloads\Migration TXTs\Batches"
-    
+
     # Create batches directory
     os.makedirs(output_dir, exist_ok=True)
-    
-    for i in range(0, len(statements), batch_size):
-        batch = statements[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        
-        batch_file = os.path.join(output_dir, f"batch_{batch_num:03d}_of_{total_batches:03d}.sql")
-        
-        with open(batch_file, 'w', encoding='utf-8') as f:
+
+    entries = []
+    first = 1
+    for batch_num, batch in enumerate(batches, 1):
+        filename = f"batch_{batch_num:03d}_of_{total_batches:03d}.sql"
+        sql = batch_sql(batch)
+        entry = manifest_entry(batch_num, first, batch, sql)
+        entry['file'] = filename
+        entries.append(entry)
+
+        with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as f:
             f.write(f"-- Batch {batch_num} of {total_batches}\n")
-            f.write(f"-- Statements {i+1} to {min(i+batch_size, len(statements))}\n")
+            f.write(f"-- Statements {first} to {first + len(batch) - 1}\n")
             f.write(f"-- Generated: {datetime.now().isoformat()}\n\n")
-            
-            for stmt in batch:
-                f.write(stmt)
-                f.write(';\n\n')
-        
-        print(f"  ✓ Created: batch_{batch_num:03d}_of_{total_batches:03d}.sql ({len(batch)} statements)")
-    
+            f.write(sql)
+        first += len(batch)
+
+        print(f"  ✓ Created: {filename} ({len(batch)} statements, {entry['bytes']:,} bytes)")
+
+    manifest_path = save_manifest(output_dir, sql_file, entries,
+                                  {'max_statements': max_statements, 'max_bytes': max_bytes})
+
     print("\n" + "="*80)
     print("✅ BATCH FILES CREATED!")
     print("="*80)
     print(f"Total batches: {total_batches}")
+    print(f"Largest batch: {max((entry['bytes'] for entry in entries), default=0):,} bytes")
     print(f"Output directory: {output_dir}")
+    print(f"Manifest: {manifest_path}")
     print("\n📋 Next steps:")
     print("1. Go to Supabase Dashboard → SQL Editor")
     print("2. Open each batch file (starting with batch_001)")
@@ -125,5 +359,169 @@ def execute_sql_via_supabase():
     print("5. Repeat for all batches")
     print("="*80)
 
+
+class BatchRunner:
+    """Schedules batches on a thread pool, stage by stage, and reports progress"""
+
+    def __init__(self, backend, workers: int, file_size: int, keep_going: bool = False):
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.file_size = file_size
+        self.keep_going = keep_going
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.stats = {'batches': 0, 'statements': 0, 'bytes': 0, 'failed_batches': [], 'stages': 0}
+        self.manifest: List[Dict] = []
+
+    def run_batch(self, batch_num: int, batch: List[str], entry: Dict):
+        started = time.monotonic()
+        try:
+            self.backend.execute(batch_sql(batch))
+        except Exception as e:
+            entry.update(status='failed', error=str(e).strip(), seconds=round(time.monotonic() - started, 3))
+            raise
+        entry.update(status='ok', seconds=round(time.monotonic() - started, 3))
+        with self.lock:
+            self.stats['batches'] += 1
+            self.stats['statements'] += len(batch)
+            self.stats['bytes'] += entry['bytes']
+            elapsed = time.monotonic() - self.started
+            percent = min(99.9, self.stats['bytes'] / self.file_size * 100) if self.file_size else 0
+            print(f"  ✓ Batch {batch_num} ({len(batch)} statements, {time.monotonic() - started:.1f}s) | "
+                  f"~{percent:.1f}% | {self.stats['statements']:,} statements | "
+                  f"{self.stats['statements'] / elapsed if elapsed else 0:,.0f}/s")
+
+    def run(self, batches) -> bool:
+        """Execute (batch_num, statements) pairs; returns False if any batch failed"""
+        in_flight: Dict = {}
+        stage = Stage()
+
+        def settle(done):
+            for future in done:
+                batch_num, batch = in_flight.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    with self.lock:
+                        self.stats['failed_batches'].append(batch_num)
+                        print(f"  ✗ Batch {batch_num} failed and was rolled back: {str(e).strip()}")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            first = 1
+            for batch_num, batch in batches:
+                entry = manifest_entry(batch_num, first, batch, batch_sql(batch))
+                first += len(batch)
+                profile = BatchProfile(batch)
+                if not stage.accepts(profile):
+                    # Dependency boundary: let everything before this batch finish first
+                    settle(wait(in_flight).done if in_flight else ())
+                    stage = Stage()
+                    self.stats['stages'] += 1
+                if self.stats['failed_batches'] and not self.keep_going:
+                    break
+                stage.add(profile)
+                self.manifest.append(entry)
+
+                # Bounded look-ahead keeps memory flat on huge files
+                while len(in_flight) >= self.workers * 2:
+                    settle(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                in_flight[pool.submit(self.run_batch, batch_num, batch, entry)] = (batch_num, batch)
+
+            settle(wait(in_flight).done if in_flight else ())
+
+        return not self.stats['failed_batches']
+
+
+def execute_sql_via_supabase(sql_file: str = SQL_FILE, backend_name: Optional[str] = None,
+                             dsn: Optional[str] = None, workers: int = 4, keep_going: bool = False,
+                             output_dir: str = BATCH_OUTPUT_DIR, max_statements: int = BATCH_SIZE,
+                             max_bytes: int = MAX_BATCH_BYTES):
+    """Execute the SQL file through the chosen backend (default: postgres if a DSN is configured)"""
+
+    dsn = dsn or default_dsn()
+    backend_name = backend_name or (BACKEND_POSTGRES if dsn else BACKEND_FILES)
+
+    print("="*80)
+    print("SQL MIGRATION EXECUTOR (Supabase)")
+    print("="*80)
+    print(f"SQL File: {sql_file}")
+    print(f"Backend: {backend_name}")
+    print("="*80)
+
+    # Check if SQL file exists
+    if not os.path.exists(sql_file):
+        print(f"❌ Error: SQL file not found: {sql_file}")
+        return False
+
+    # Get file size
+    file_size = os.path.getsize(sql_file)
+    print(f"\n📁 SQL file size: {file_size:,} bytes ({file_size / 1024 / 1024:.2f} MB)")
+
+    if backend_name == BACKEND_FILES:
+        write_batch_files(sql_file, output_dir, max_statements, max_bytes)
+        return True
+
+    if backend_name == BACKEND_POSTGRES:
+        if not dsn:
+            print("❌ Error: no database connection string (use --dsn, SUPABASE_DB_URL or SUPABASE_DB_PASSWORD)")
+            return False
+        backend = PostgresBackend(dsn)
+    else:
+        supabase_url = os.getenv('SUPABASE_URL')
+        supabase_key = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+        if not supabase_url or not supabase_key:
+            print("❌ Error: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in .env file")
+            return False
+        backend = RpcBackend(supabase_url, supabase_key)
+
+    print(f"\n🚀 Executing batches of up to {max_statements} statements / {max_bytes:,} bytes on {workers} worker(s) via {backend.describe()}")
+    print("="*80)
+
+    runner = BatchRunner(backend, workers, file_size, keep_going=keep_going)
+    batches = enumerate(split_batches(iter_sql_statements(sql_file), max_statements, max_bytes), 1)
+    try:
+        success = runner.run(batches)
+    finally:
+        backend.close()
+        manifest_path = save_manifest(output_dir, sql_file, runner.manifest,
+                                      {'max_statements': max_statements, 'max_bytes': max_bytes})
+
+    stats = runner.stats
+    elapsed = time.monotonic() - runner.started
+    print("\n" + "="*80)
+    print("✅ MIGRATION COMPLETE!" if success else "❌ MIGRATION FINISHED WITH ERRORS")
+    print("="*80)
+    print(f"Batches executed: {stats['batches']}")
+    print(f"Statements executed: {stats['statements']:,}")
+    print(f"Dependency stages: {stats['stages'] + 1}")
+    print(f"Elapsed: {elapsed:.1f}s")
+    print(f"Manifest: {manifest_path}")
+    if stats['failed_batches']:
+        print(f"Failed batches (rolled back): {', '.join(map(str, sorted(stats['failed_batches'])))}")
+        if not keep_going:
+            print("Stopped at the first failure; later batches were not run (use --keep-going to continue)")
+    print("="*80)
+    return success
+
+
+def main():
+    """Parse command line arguments and run the migration"""
+    parser = argparse.ArgumentParser(description="Execute a migration SQL file against Supabase in batches")
+    parser.add_argument('--file', dest='sql_file', default=SQL_FILE, help="SQL file to execute")
+    parser.add_argument('--backend', choices=[BACKEND_POSTGRES, BACKEND_RPC, BACKEND_FILES],
+                        help="Where batches go (default: postgres if a connection string is configured, else files)")
+    parser.add_argument('--dsn', help="Postgres connection string (default: SUPABASE_DB_URL)")
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent batches when they are independent")
+    parser.add_argument('--keep-going', action='store_true', help="Continue with later batches after a failure")
+    parser.add_argument('--max-statements', type=int, default=BATCH_SIZE, help="Most statements per batch")
+    parser.add_argument('--max-bytes', type=int, default=MAX_BATCH_BYTES, help="Most bytes of SQL per batch")
+    parser.add_argument('--output-dir', default=BATCH_OUTPUT_DIR,
+                        help="Batch files (--backend files) and batch_manifest.json go here")
+    args = parser.parse_args()
+
+    success = execute_sql_via_supabase(args.sql_file, args.backend, args.dsn, args.workers,
+                                       args.keep_going, args.output_dir, args.max_statements, args.max_bytes)
+    return 0 if success else 1
+
 if __name__ == "__main__":
-    execute_sql_via_supabase()
+    sys.exit(main())
@@ -20,6 +20,8 @@ import os
 from datetime import datetime
 import uuid
 
+from excel_stream import ExcelRowSource
+
 # =====================================================
 # CONFIGURATION
 # =====================================================
@@ -501,28 +503,27 @@ def import_survey_data(excel_path: str):
     print("2021 MSME SURVEY DATA IMPORT")
     print("="*80 + "\n")
     
-    # Read Excel file
+    # Open the Excel file; rows are streamed as they are parsed
     print(f"📂 Reading Excel file: {excel_path}")
     try:
-        df = pd.read_excel(excel_path)
-        print(f"  ✓ Loaded {len(df)} rows\n")
+        source = ExcelRowSource(excel_path)
+        print(f"  ✓ Found {len(source.columns)} columns (~{source.rows_hint or '?'} rows)\n")
     except Exception as e:
         print(f"  ✗ Error reading Excel file: {str(e)}")
         return
     
-    # Convert DataFrame to list of dictionaries
-    rows = df.to_dict('records')
-    
     # Statistics
-    total_rows = len(rows)
+    total_rows = 0
     successful_imports = 0
     failed_imports = 0
     skipped_rows = 0
     
-    print(f"🚀 Starting import of {total_rows} survey responses...\n")
+    print(f"🚀 Starting import of survey responses...\n")
     
-    for idx, row in enumerate(rows, 1):
-        print(f"[{idx}/{total_rows}] Processing response...")
+    for position, row in source:
+        idx = position + 1
+        total_rows = idx
+        print(f"[{idx}/~{source.rows_hint or '?'}] Processing response...")
         
         try:
             # Extract key fields
@@ -16,6 +16,8 @@ import sys
 from datetime import datetime
 import time
 
+from auth_directory import AuthUserDirectory
+
 # Load environment variables
 load_dotenv()
 
@@ -53,6 +55,14 @@ def create_or_get_user(email: str, company_name: str, full_name: str = None):
     Create a new user in Supabase Auth or get existing user ID
     Returns user_id
     """
+    directory = AuthUserDirectory.for_client(supabase)
+    
+    # Existing users are resolved from the paged, case-insensitive index
+    user_id = directory.get(email)
+    if user_id:
+        print(f"  ✓ Found existing user: {email}")
+        return user_id
+    
     try:
         # Try to create user with service role
         auth_response = supabase.auth.admin.create_user({
@@ -68,6 +78,7 @@ def create_or_get_user(email: str, company_name: str, full_name: str = None):
         })
         
         user_id = auth_response.user.id
+        directory.add(email, user_id)
         print(f"  ✓ Created new user: {email}")
         return user_id
         
@@ -78,14 +89,13 @@ def create_or_get_user(email: str, company_name: str, full_name: str = None):
         if "already registered" in error_msg.lower() or "duplicate" in error_msg.lower():
             print(f"  ℹ User already exists: {email}, fetching user ID...")
             
-            # Get existing user by email
+            # Created since the index was loaded: reload it once
             try:
-                # Use service role to list users and find by email
-                users_response = supabase.auth.admin.list_users()
-                for user in users_response:
-                    if user.email == email:
-                        print(f"  ✓ Found existing user: {email}")
-                        return user.id
+                directory.refresh()
+                user_id = directory.get(email)
+                if user_id:
+                    print(f"  ✓ Found existing user: {email}")
+                    return user_id
                 
                 print(f"  ⚠ Could not find existing user: {email}")
                 return None
@@ -13,6 +13,8 @@ import sys
 from datetime import datetime
 import time
 
+from auth_directory import AuthUserDirectory
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv('SUPABASE_URL')
@@ -27,6 +29,11 @@ def clean_text(value):
     return str(value).strip()
 
 def create_or_get_user(email: str, company_name: str, full_name: str = None):
+    directory = AuthUserDirectory.for_client(supabase)
+    user_id = directory.get(email)
+    if user_id:
+        print(f"  ✓ Found existing user: {email}")
+        return user_id
     try:
         auth_response = supabase.auth.admin.create_user({
             "email": email,
@@ -40,14 +47,15 @@ def create_or_get_user(email: str, company_name: str, full_name: str = None):
             }
         })
         print(f"  ✓ Created new user: {email}")
+        directory.add(email, auth_response.user.id)
         return auth_response.user.id
     except Exception as e:
         if "already registered" in str(e).lower():
             print(f"  ℹ User exists: {email}, fetching ID...")
-            users_response = supabase.auth.admin.list_users()
-            for user in users_response:
-                if user.email == email:
-                    return user.id
+            directory.refresh()
+            user_id = directory.get(email)
+            if user_id:
+                return user_id
         print(f"  ✗ Error: {e}")
         return None
 
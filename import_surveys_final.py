@@ -15,6 +15,8 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 import traceback
 
+from user_provisioning import UserProvisioner, STATUS_CREATED
+
 # Load environment variables
 load_dotenv()
 
@@ -28,6 +30,7 @@ class SurveyImporter:
             raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in .env file")
         
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        self.provisioner = UserProvisioner(self.supabase_url, self.supabase_key)
         
         # Statistics
         self.stats = {
@@ -67,19 +70,17 @@ class SurveyImporter:
             # Create user with Supabase Admin API
             # Set a default password so users can log in
             default_password = os.getenv('DEFAULT_PASSWORD', '@ESCPNetwork2025#')
-            new_user = self.supabase.auth.admin.create_user({
-                'email': email,
-                'password': default_password,
-                'email_confirm': True,
-                'user_metadata': {
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'role_title': role_title
-                }
+            result = self.provisioner.create_user(email, default_password, {
+                'first_name': first_name,
+                'last_name': last_name,
+                'role_title': role_title
             })
             
-            if new_user and hasattr(new_user, 'user'):
-                user_id = new_user.user.id
+            if result['status'] != STATUS_CREATED:
+                raise Exception(result['error'] or 'User already registered')
+            
+            if result['user_id']:
+                user_id = result['user_id']
                 self.stats['users_created'] += 1
                 print(f"✓ Created user: {email}")
                 
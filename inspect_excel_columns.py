@@ -8,6 +8,8 @@ so we can map them correctly to the database.
 import pandas as pd
 import sys
 
+from excel_cache import read_excel_cached
+
 if len(sys.argv) < 2:
     print("Usage: python inspect_excel_columns.py <excel_file>")
     sys.exit(1)
@@ -21,7 +23,7 @@ print(f"\nFile: {excel_file}\n")
 
 try:
     # Read Excel file
-    df = pd.read_excel(excel_file)
+    df = read_excel_cached(excel_file)
     
     print(f"Total Rows: {len(df)}")
     print(f"Total Columns: {len(df.columns)}")
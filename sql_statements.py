@@ -0,0 +1,195 @@
+"""
+STREAMING SQL STATEMENT SPLITTER
+Splits a SQL script into statements while reading it in chunks, so
+multi-megabyte migrations never have to be held in memory as one string.
+
+Unlike a plain split on ';' it understands:
+- single-quoted strings ('it''s; fine') and E'...' strings with backslash escapes
+- double-quoted identifiers
+- dollar-quoted bodies ($$ ... $$, $fn$ ... $fn$)
+- -- line comments and (nested) /* block */ comments
+
+Statements are yielded without the terminating ';' and without leading
+comments; comment-only fragments are dropped. Nothing is filtered by length.
+
+Usage:
+    from sql_statements import iter_sql_statements, group_statements
+    for statement in iter_sql_statements('COMBINED_MIGRATION.sql'):
+        ...
+    for group in group_statements(statements, max_statements=25, max_bytes=1 << 20):
+        cursor.execute(join_statements(group))   # one server round trip
+"""
+
+import re
+from typing import IO, Iterable, Iterator, List, Optional, Union
+
+# Characters that can start a token the splitter must look inside
+SPECIAL_PATTERN = re.compile(r"[;'\"$/-]")
+DOLLAR_TAG_PATTERN = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+STRING_END_PATTERN = re.compile(r"''|'")
+ESCAPE_STRING_END_PATTERN = re.compile(r"\\.|''|'", re.S)
+IDENTIFIER_END_PATTERN = re.compile(r'""|"')
+BLOCK_COMMENT_PATTERN = re.compile(r"/\*|\*/")
+
+# Longest dollar-quote tag we wait for more input to complete
+MAX_DOLLAR_TAG = 64
+
+
+def _is_identifier_char(ch: str) -> bool:
+    return ch.isalnum() or ch in '_$'
+
+
+def _token_end(buf: str, i: int, eof: bool) -> Optional[int]:
+    """
+    Index just past the quoted string / comment starting at buf[i], i + 1 if
+    buf[i] does not start one, or None if more input is needed to tell.
+    """
+    ch = buf[i]
+    if ch == "'":
+        escaped = i > 0 and buf[i - 1] in 'eE' and (i < 2 or not _is_identifier_char(buf[i - 2]))
+        pattern = ESCAPE_STRING_END_PATTERN if escaped else STRING_END_PATTERN
+        pos = i + 1
+        while True:
+            match = pattern.search(buf, pos)
+            if match is None:
+                return len(buf) if eof else None
+            if match.group() == "'":
+                # A quote at the very end may be the first half of ''
+                if match.end() == len(buf) and not eof:
+                    return None
+                return match.end()
+            pos = match.end()
+
+    if ch == '"':
+        pos = i + 1
+        while True:
+            match = IDENTIFIER_END_PATTERN.search(buf, pos)
+            if match is None:
+                return len(buf) if eof else None
+            if match.group() == '"':
+                if match.end() == len(buf) and not eof:
+                    return None
+                return match.end()
+            pos = match.end()
+
+    if ch == '$':
+        if i > 0 and _is_identifier_char(buf[i - 1]):
+            return i + 1
+        match = DOLLAR_TAG_PATTERN.match(buf, i)
+        if match is None:
+            if not eof and len(buf) - i < MAX_DOLLAR_TAG:
+                return None
+            return i + 1
+        close = buf.find(match.group(), match.end())
+        if close == -1:
+            return len(buf) if eof else None
+        return close + len(match.group())
+
+    if ch in '-/':
+        if i + 1 == len(buf):
+            return len(buf) if eof else None
+        if ch == '-' and buf[i + 1] == '-':
+            newline = buf.find('\n', i + 2)
+            if newline == -1:
+                return len(buf) if eof else None
+            return newline + 1
+        if ch == '/' and buf[i + 1] == '*':
+            depth = 1
+            pos = i + 2
+            while depth:
+                match = BLOCK_COMMENT_PATTERN.search(buf, pos)
+                if match is None:
+                    return len(buf) if eof else None
+                depth += 1 if match.group() == '/*' else -1
+                pos = match.end()
+            return pos
+
+    return i + 1
+
+
+def _strip_leading_comments(text: str) -> str:
+    """Statement text without leading whitespace and comments ('' if nothing else remains)"""
+    while True:
+        text = text.lstrip()
+        if text.startswith('--'):
+            newline = text.find('\n')
+            text = '' if newline == -1 else text[newline + 1:]
+        elif text.startswith('/*'):
+            end = _token_end(text, 0, True)
+            text = text[end:]
+        else:
+            return text.rstrip()
+
+
+def iter_sql_statements(source: Union[str, IO[str]], chunk_size: int = 1 << 20) -> Iterator[str]:
+    """Yield the statements of a SQL script (a path or an open text file) one at a time"""
+    own_file = isinstance(source, str)
+    f = open(source, 'r', encoding='utf-8') if own_file else source
+    try:
+        buf = ''
+        start = pos = 0
+        eof = False
+        while True:
+            match = SPECIAL_PATTERN.search(buf, pos)
+            if match is not None:
+                i = match.start()
+                if buf[i] == ';':
+                    statement = _strip_leading_comments(buf[start:i])
+                    if statement:
+                        yield statement
+                    start = pos = i + 1
+                    continue
+                end = _token_end(buf, i, eof)
+                if end is not None:
+                    pos = end
+                    continue
+                pos = i
+            elif eof:
+                break
+            else:
+                pos = len(buf)
+
+            # Need more input: drop what has been consumed and read the next chunk
+            if eof:
+                break
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[start:] + chunk
+            pos -= start
+            start = 0
+
+        statement = _strip_leading_comments(buf[start:])
+        if statement:
+            yield statement
+    finally:
+        if own_file:
+            f.close()
+
+
+def terminate(statement: str) -> str:
+    """Statement with its ';' (on a new line if the last line may end in a -- comment)"""
+    if '--' in statement[statement.rfind('\n') + 1:]:
+        return statement + '\n;'
+    return statement + ';'
+
+
+def join_statements(statements: List[str]) -> str:
+    """One script string for several statements, e.g. for a single cursor.execute()"""
+    return '\n'.join(terminate(statement) for statement in statements)
+
+
+def group_statements(statements: Iterable[str], max_statements: int = 25,
+                     max_bytes: int = 1 << 20) -> Iterator[List[str]]:
+    """Group statements into lists of at most max_statements and (roughly) max_bytes of UTF-8"""
+    group: List[str] = []
+    size = 0
+    for statement in statements:
+        statement_size = len(statement.encode('utf-8')) + 2
+        if group and (len(group) >= max_statements or size + statement_size > max_bytes):
+            yield group
+            group = []
+            size = 0
+        group.append(statement)
+        size += statement_size
+    if group:
+        yield group
@@ -15,10 +15,19 @@ from typing import List, Dict, Any, Optional, Tuple
 import requests
 import json
 from collections import defaultdict
-import time
 import certifi
 import ssl
 from supabase import create_client, Client
+import os
+import psycopg2
+from psycopg2.extras import execute_values
+
+# Shared helpers live at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from auth_directory import AuthUserDirectory
+from company_matching import CompanyMatchIndex
+from excel_cache import read_excel_cached
+from user_provisioning import UserProvisioner, STATUS_CREATED, STATUS_EXISTING
 
 # Configure logging with UTF-8 encoding for Windows
 logging.basicConfig(
@@ -53,56 +62,46 @@ class SupabaseAuthManager:
         # Create a session with SSL verification
         self.session = requests.Session()
         self.session.verify = certifi.where()
+        
+        # Rate-limited, retrying creates on a bounded worker pool
+        self.provisioner = UserProvisioner(supabase_url, service_role_key)
+        
+        # All auth users, paged in once per migration (email -> user_id)
+        self.directory = AuthUserDirectory.for_rest(self.session, self.supabase_url, self.headers)
     
-    def create_user(self, email: str, password: str, metadata: Dict = None) -> Optional[str]:
-        """Create a new user in Supabase Auth and return user_id"""
-        try:
-            payload = {
-                "email": email,
-                "password": password,
-                "email_confirm": True,  # Auto-confirm email
-                "user_metadata": metadata or {}
-            }
-            
-            response = self.session.post(
-                self.auth_url,
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200 or response.status_code == 201:
-                user_data = response.json()
-                user_id = user_data.get('id')
-                logger.info(f"  [OK] Created user: {email} (ID: {user_id})")
-                return user_id
-            elif response.status_code == 422:
-                # User already exists, try to get existing user
-                logger.warning(f"  [!] User already exists: {email}, fetching existing user...")
-                return self.get_user_by_email(email)
-            else:
-                logger.error(f"  [X] Failed to create user {email}: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"  [X] Error creating user {email}: {e}")
-            return None
+    def _resolve(self, email: str, result: Dict) -> Tuple[Optional[str], bool]:
+        """Turn a provisioning result into (user_id, created), looking up users that already exist"""
+        if result['status'] == STATUS_CREATED:
+            logger.info(f"  [OK] Created user: {email} (ID: {result['user_id']})")
+            self.directory.add(email, result['user_id'])
+            return result['user_id'], True
+        elif result['status'] == STATUS_EXISTING:
+            # User already exists, try to get existing user
+            logger.warning(f"  [!] User already exists: {email}, fetching existing user...")
+            if email.strip().lower() not in self.directory.index:
+                # Created after the index was loaded (e.g. by another run); re-page once
+                self.directory.refresh()
+            return self.get_user_by_email(email), False
+        else:
+            logger.error(f"  [X] Failed to create user {email}: {result['error']}")
+            return None, False
+    
+    def create_user(self, email: str, password: str, metadata: Dict = None) -> Tuple[Optional[str], bool]:
+        """Create a new user in Supabase Auth and return (user_id, created)"""
+        return self._resolve(email, self.provisioner.create_user(email, password, metadata))
+    
+    def create_users(self, users: List[Dict]) -> Dict[str, Tuple[Optional[str], bool]]:
+        """Create many users concurrently; returns email -> (user_id, created), user_id None on failure"""
+        results = self.provisioner.provision(users)
+        return {user['email']: self._resolve(user['email'], results[user['email']]) for user in users}
     
     def get_user_by_email(self, email: str) -> Optional[str]:
-        """Get existing user ID by email"""
+        """Get existing user ID by email from the paged auth user index"""
         try:
-            # List all users and find by email
-            url = f"{self.supabase_url}/auth/v1/admin/users"
-            response = self.session.get(url, headers=self.headers, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                users = data.get('users', [])
-                for user in users:
-                    if user.get('email', '').lower() == email.lower():
-                        user_id = user.get('id')
-                        logger.info(f"  [OK] Found existing user: {email} (ID: {user_id})")
-                        return user_id
+            user_id = self.directory.get(email)
+            if user_id:
+                logger.info(f"  [OK] Found existing user: {email} (ID: {user_id})")
+                return user_id
             
             logger.warning(f"  [!] Could not find existing user: {email}")
             return None
@@ -333,7 +332,8 @@ class Survey2021Migrator:
     # Boolean column
     BOOLEAN_COLUMN = 'report_sdgs'
     
-    def __init__(self, db_config: Dict[str, str], supabase_url: str, service_role_key: str, default_password: str, dry_run: bool = False):
+    def __init__(self, db_config: Dict[str, str], supabase_url: str, service_role_key: str, default_password: str, dry_run: bool = False,
+                 company_match_threshold: Optional[float] = None):
         """Initialize migrator with database and Supabase configuration"""
         self.db_config = db_config
         self.conn = None
@@ -341,8 +341,21 @@ class Survey2021Migrator:
         self.auth_manager = SupabaseAuthManager(supabase_url, service_role_key)
         self.default_password = default_password
         self.dry_run = dry_run
-        self.user_cache = {}  # Cache for created users: email -> user_id
+        # email (lower-cased) -> user_id; the same dict as the auth directory index,
+        # so users found by the paged pre-load and users created here share one cache
+        self.user_cache = self.auth_manager.directory.index
         self.company_cache = {}  # Cache for companies: firm_name -> company_name
+        # Folds near-duplicate firm names into one company (None = exact match only)
+        self.company_matcher = CompanyMatchIndex(company_match_threshold) if company_match_threshold else None
+        self.new_users = set()  # Created up front by provision_users, not yet reported
+        
+        # Statistics
+        self.stats = {
+            'users_created': 0,
+            'existing_user_rows': 0,
+            'inserted': 0,
+            'failed': 0
+        }
         
     def connect(self):
         """Establish database connection"""
@@ -371,16 +384,23 @@ class Survey2021Migrator:
         normalized = str(firm_name).lower().strip()
         return normalized
     
-    def get_or_create_user(self, email: str, firm_name: str, participant_name: str) -> Optional[str]:
-        """Get existing user or create new one in Supabase Auth"""
+    def get_or_create_user(self, email: str, firm_name: str, participant_name: str) -> Tuple[Optional[str], bool]:
+        """
+        Get existing user or create new one in Supabase Auth.
+        Returns (user_id, created); created is True the first time a user made by this run is returned.
+        """
         if self.dry_run:
             logger.info(f"  [DRY RUN] Would create user: {email}")
-            return "dry-run-user-id"
+            return "dry-run-user-id", False
+        
+        email = str(email).strip().lower()
         
         # Check cache first
         if email in self.user_cache:
             logger.info(f"  [CACHE] Using cached user: {email}")
-            return self.user_cache[email]
+            created = email in self.new_users
+            self.new_users.discard(email)
+            return self.user_cache[email], created
         
         # Create user metadata
         metadata = {
@@ -391,15 +411,51 @@ class Survey2021Migrator:
         }
         
         # Create user via Supabase Auth
-        user_id = self.auth_manager.create_user(email, self.default_password, metadata)
+        user_id, created = self.auth_manager.create_user(email, self.default_password, metadata)
         
         if user_id:
             self.user_cache[email] = user_id
         
-        # Small delay to avoid rate limiting
-        time.sleep(0.1)
+        return user_id, created
+    
+    def provision_users(self, df: pd.DataFrame):
+        """Create all distinct users of the sheet up front on the provisioning pool"""
+        if self.dry_run:
+            return
+        
+        # One paged listing of existing users, so reruns skip the create/422 round trip
+        self.auth_manager.directory.load()
         
-        return user_id
+        users = []
+        seen = set()
+        for _, row in df.iterrows():
+            email = str(row['Email Address']).strip().lower()
+            if email in self.user_cache or email in seen:
+                continue
+            seen.add(email)
+            users.append({
+                'email': email,
+                'password': self.default_password,
+                'user_metadata': {
+                    "firm_name": row['1. Name of firm'],
+                    "participant_name": self.clean_value(row.get('2. Name of participant', '')),
+                    "imported_from": "2021_survey",
+                    "import_date": datetime.now().isoformat()
+                }
+            })
+        
+        logger.info(f"Provisioning {len(users)} users...")
+        for email, (user_id, created) in self.auth_manager.create_users(users).items():
+            if user_id:
+                self.user_cache[email] = user_id
+            if created:
+                self.new_users.add(email)
+    
+    # Cell values treated as missing
+    NULL_TOKENS = ['NULL', 'NA', 'N/A', '-', '']
+    
+    # Accepted spellings for the boolean column
+    BOOLEAN_VALUES = {'yes': True, 'true': True, '1': True, 'no': False, 'false': False, '0': False}
     
     def clean_value(self, value: Any) -> Optional[Any]:
         """Clean and normalize values from Excel"""
@@ -407,98 +463,146 @@ class Survey2021Migrator:
             return None
         if isinstance(value, str):
             value = value.strip()
-            if value.upper() in ['NULL', 'NA', 'N/A', '-', '']:
+            if value.upper() in self.NULL_TOKENS:
                 return None
         return value
     
-    def convert_to_array(self, value: Any) -> Optional[List[str]]:
-        """Convert comma-separated string to PostgreSQL array"""
-        cleaned = self.clean_value(value)
-        if cleaned is None:
-            return None
-        
-        if isinstance(cleaned, str):
-            # Split by comma and clean each item
-            items = [item.strip() for item in cleaned.split(',')]
-            return [item for item in items if item]
-        
-        return None
+    @staticmethod
+    def string_mask(series: pd.Series) -> pd.Series:
+        """True where the cell holds a str"""
+        return series.apply(isinstance, args=(str,)).astype(bool)
     
-    def convert_to_boolean(self, value: Any) -> Optional[bool]:
-        """Convert string to boolean"""
-        cleaned = self.clean_value(value)
-        if cleaned is None:
-            return None
-        
-        if isinstance(cleaned, str):
-            if cleaned.lower() in ['yes', 'true', '1']:
-                return True
-            elif cleaned.lower() in ['no', 'false', '0']:
-                return False
-        
-        return None
+    def clean_series(self, series: pd.Series) -> pd.Series:
+        """Column-wise clean_value: strip strings, mask NaN and null tokens to None"""
+        series = series.astype(object)
+        is_str = self.string_mask(series)
+        stripped = series[is_str].str.strip()
+        series[is_str] = stripped
+        is_null = series.isna()
+        is_null[is_str] = stripped.str.upper().isin(self.NULL_TOKENS)
+        return series.where(~is_null, None)
     
-    def convert_timestamp(self, value: Any) -> Optional[datetime]:
-        """Convert Excel timestamp to datetime"""
-        cleaned = self.clean_value(value)
-        if cleaned is None:
-            return None
-        
-        if isinstance(cleaned, datetime):
-            return cleaned
-        
-        if isinstance(cleaned, str):
-            try:
-                return pd.to_datetime(cleaned)
-            except:
-                logger.warning(f"Could not parse timestamp: {cleaned}")
-                return None
-        
-        return None
+    def convert_array_series(self, series: pd.Series) -> pd.Series:
+        """Comma-separated strings -> lists of trimmed, non-empty items (None otherwise)"""
+        cleaned = self.clean_series(series)
+        is_str = self.string_mask(cleaned)
+        items = cleaned[is_str].str.split(',').explode().str.strip()
+        items = items[items != '']
+        lists = items.groupby(level=0, sort=False).agg(list)
+        
+        result = pd.Series([None] * len(series), index=series.index, dtype=object)
+        result[lists.index] = lists
+        # Strings holding only separators still become an empty array
+        for idx in is_str[is_str].index.difference(lists.index):
+            result[idx] = []
+        return result.where(result.notna(), None)
     
-    def prepare_row(self, row: pd.Series, user_id: str, company_name: str) -> Dict[str, Any]:
-        """Prepare a single row for insertion"""
-        prepared = {
-            'user_id': user_id,
-            'company_name': company_name
-        }
-        
+    def convert_boolean_series(self, series: pd.Series) -> pd.Series:
+        """yes/true/1 -> True, no/false/0 -> False, anything else -> None"""
+        cleaned = self.clean_series(series)
+        is_str = self.string_mask(cleaned)
+        result = pd.Series([None] * len(series), index=series.index, dtype=object)
+        mapped = cleaned[is_str].str.lower().map(self.BOOLEAN_VALUES)
+        result[mapped.index] = mapped
+        return result.where(result.notna(), None)
+    
+    def convert_timestamp_series(self, series: pd.Series) -> pd.Series:
+        """Datetime cells pass through, strings are parsed, anything else -> None"""
+        if pd.api.types.is_datetime64_any_dtype(series):
+            converted = series
+        else:
+            cleaned = self.clean_series(series)
+            is_str = self.string_mask(cleaned)
+            converted = pd.Series(None, index=series.index, dtype=object)
+            if is_str.any():
+                # Each distinct string is parsed on its own (as the per-cell parse did), so
+                # mixed formats in one column all survive; repeated values are parsed once
+                parsed = {}
+                for value in cleaned[is_str].unique():
+                    try:
+                        parsed[value] = pd.to_datetime(value)
+                    except Exception:
+                        logger.warning(f"Could not parse timestamp: {value}")
+                        parsed[value] = None
+                converted[is_str] = cleaned[is_str].map(parsed)
+            is_dt = ~is_str & cleaned.map(lambda v: isinstance(v, datetime))
+            if is_dt.any():
+                converted[is_dt] = cleaned[is_dt]
+        converted = converted.astype(object)
+        return converted.where(converted.notna(), None)
+    
+    def prepare_frame(self, df: pd.DataFrame) -> Dict[Any, Dict[str, Any]]:
+        """
+        Convert every mapped column of df in one pass per column.
+        Returns df index -> parameter dict (user_id / company_name are added per row).
+        """
+        columns = {}
         for excel_col, sql_col in self.COLUMN_MAPPING.items():
-            if excel_col not in row.index:
+            if excel_col not in df.columns:
                 logger.warning(f"Column '{excel_col}' not found in Excel data")
-                prepared[sql_col] = None
+                columns[sql_col] = pd.Series([None] * len(df), index=df.index, dtype=object)
                 continue
             
-            value = row[excel_col]
+            series = df[excel_col]
             
             # Special handling for timestamp
             if sql_col == 'timestamp':
-                prepared[sql_col] = self.convert_timestamp(value)
+                columns[sql_col] = self.convert_timestamp_series(series)
             # Special handling for boolean
             elif sql_col == self.BOOLEAN_COLUMN:
-                prepared[sql_col] = self.convert_to_boolean(value)
+                columns[sql_col] = self.convert_boolean_series(series)
             # Special handling for arrays
             elif sql_col in self.ARRAY_COLUMNS:
-                prepared[sql_col] = self.convert_to_array(value)
+                columns[sql_col] = self.convert_array_series(series)
             # Regular text handling
             else:
-                prepared[sql_col] = self.clean_value(value)
+                columns[sql_col] = self.clean_series(series)
         
+        prepared = pd.DataFrame(columns, index=df.index)
+        return dict(zip(df.index, prepared.to_dict('records')))
+    
+    def prepare_row(self, row: pd.Series, user_id: str, company_name: str) -> Dict[str, Any]:
+        """Prepare a single row for insertion"""
+        prepared = next(iter(self.prepare_frame(row.to_frame().T).values()))
+        prepared.update(user_id=user_id, company_name=company_name)
         return prepared
     
-    def build_insert_query(self) -> str:
-        """Build the INSERT query with all columns"""
+    def build_insert_query(self) -> Tuple[str, str]:
+        """Build the multi-row INSERT query and per-row VALUES template for execute_values"""
         columns = ['user_id', 'company_name'] + list(self.COLUMN_MAPPING.values())
         placeholders = [f"%({col})s" for col in columns]
         
         query = f"""
         INSERT INTO public.survey_responses_2021 (
             {', '.join(columns)}
-        ) VALUES (
-            {', '.join(placeholders)}
-        )
+        ) VALUES %s
         """
-        return query
+        template = f"({', '.join(placeholders)})"
+        return query, template
+    
+    def insert_batch(self, batch: List[Tuple[str, Dict[str, Any]]], query: str, template: str) -> Tuple[int, int]:
+        """
+        Insert (email, prepared_row) pairs in one statement and one commit.
+        On failure, bisect the batch so only the bad row(s) are rejected.
+        Returns (inserted, failed).
+        """
+        if not batch:
+            return 0, 0
+        
+        try:
+            execute_values(self.cursor, query, [row for _, row in batch], template=template, page_size=len(batch))
+            self.conn.commit()
+            return len(batch), 0
+        except Exception as e:
+            self.conn.rollback()
+            if len(batch) == 1:
+                logger.error(f"    [X] Failed to insert response for {batch[0][0]}: {e}")
+                return 0, 1
+        
+        mid = len(batch) // 2
+        left = self.insert_batch(batch[:mid], query, template)
+        right = self.insert_batch(batch[mid:], query, template)
+        return left[0] + right[0], left[1] + right[1]
     
     def group_by_company(self, df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
         """Group responses by company (firm_name)"""
@@ -507,6 +611,12 @@ class Survey2021Migrator:
         # Add normalized company column
         df['normalized_company'] = df['1. Name of firm'].apply(self.normalize_company_name)
         
+        # Merge near-duplicate spellings into the first one seen
+        if self.company_matcher:
+            canonical = {name: self.company_matcher.resolve(name) for name in df['normalized_company'].dropna().unique()}
+            df['normalized_company'] = [canonical.get(name, name) for name in df['normalized_company']]
+            logger.info(f"[OK] Merged {len(self.company_matcher.merges)} near-duplicate firm names")
+        
         # Group by normalized company
         grouped = df.groupby('normalized_company')
         
@@ -607,7 +717,7 @@ class Survey2021Migrator:
         try:
             # Read Excel file
             logger.info(f"Reading Excel file: {excel_file}")
-            df = pd.read_excel(excel_file)
+            df = read_excel_cached(excel_file)
             logger.info(f"[OK] Excel file loaded: {len(df)} rows, {len(df.columns)} columns")
             
             # Validate data
@@ -623,6 +733,9 @@ class Survey2021Migrator:
             # Group by company
             company_groups = self.group_by_company(df_valid)
             
+            # Create all users before touching the database
+            self.provision_users(df_valid)
+            
             # Connect to database
             self.connect()
             
@@ -631,9 +744,23 @@ class Survey2021Migrator:
             logger.info("CREATING USERS AND INSERTING DATA")
             logger.info("="*80 + "\n")
             
-            inserted_count = 0
-            error_count = 0
-            users_created = 0
+            # Convert every column once up front instead of cell by cell per row
+            try:
+                prepared_rows = self.prepare_frame(df_valid)
+            except Exception as e:
+                logger.error(f"[X] Failed to prepare responses: {e}")
+                raise
+            
+            # Built once; rows are written batch_size at a time with one commit per batch
+            insert_query, insert_template = self.build_insert_query()
+            pending = []
+            
+            def flush():
+                inserted, failed = self.insert_batch(pending, insert_query, insert_template)
+                self.stats['inserted'] += inserted
+                self.stats['failed'] += failed
+                logger.info(f"    [OK] Batch written: {inserted} inserted, {failed} failed")
+                pending.clear()
             
             for company_name, company_df in company_groups.items():
                 logger.info(f"\n[>>] Processing company: {company_name}")
@@ -648,36 +775,32 @@ class Survey2021Migrator:
                     logger.info(f"\n  [USER] Processing: {email} ({participant_name or 'Unknown'})")
                     
                     # Create or get user
-                    user_id = self.get_or_create_user(email, firm_name, participant_name)
+                    user_id, created = self.get_or_create_user(email, firm_name, participant_name)
                     
                     if not user_id:
                         logger.error(f"    [X] Failed to create/get user for {email}")
-                        error_count += 1
+                        self.stats['failed'] += 1
                         continue
                     
-                    if user_id not in [v for k, v in self.user_cache.items() if k != email]:
-                        users_created += 1
+                    if created:
+                        self.stats['users_created'] += 1
+                    else:
+                        self.stats['existing_user_rows'] += 1
                     
-                    # Prepare row data
-                    try:
-                        prepared_row = self.prepare_row(row, user_id, company_name)
-                        
-                        # Insert into database
-                        if not self.dry_run:
-                            insert_query = self.build_insert_query()
-                            self.cursor.execute(insert_query, prepared_row)
-                            self.conn.commit()
-                            logger.info(f"    [OK] Survey response inserted")
-                        else:
-                            logger.info(f"    [DRY RUN] Would insert survey response")
-                        
-                        inserted_count += 1
-                        
-                    except Exception as e:
-                        if not self.dry_run:
-                            self.conn.rollback()
-                        logger.error(f"    [X] Failed to insert response: {e}")
-                        error_count += 1
+                    # Prepared row data
+                    prepared_row = dict(prepared_rows[idx], user_id=user_id, company_name=company_name)
+                    
+                    if self.dry_run:
+                        logger.info(f"    [DRY RUN] Would insert survey response")
+                        self.stats['inserted'] += 1
+                        continue
+                    
+                    pending.append((email, prepared_row))
+                    if len(pending) >= batch_size:
+                        flush()
+            
+            if pending:
+                flush()
             
             # Summary
             logger.info("\n" + "="*80)
@@ -686,16 +809,17 @@ class Survey2021Migrator:
             logger.info(f"Total rows in Excel: {len(df)}")
             logger.info(f"Valid rows (with email & firm): {total_rows}")
             logger.info(f"Unique companies: {len(company_groups)}")
-            logger.info(f"Users created: {users_created}")
-            logger.info(f"Survey responses inserted: {inserted_count}")
-            logger.info(f"Failed: {error_count}")
-            logger.info(f"Success rate: {(inserted_count/total_rows*100):.2f}%")
+            logger.info(f"Users created: {self.stats['users_created']}")
+            logger.info(f"Responses from existing users: {self.stats['existing_user_rows']}")
+            logger.info(f"Survey responses inserted: {self.stats['inserted']}")
+            logger.info(f"Failed: {self.stats['failed']}")
+            logger.info(f"Success rate: {(self.stats['inserted']/total_rows*100):.2f}%")
             logger.info("\n📋 Company Summary:")
             for company_name, group_df in company_groups.items():
                 logger.info(f"  - {company_name}: {len(group_df)} response(s)")
             logger.info("="*80)
             
-            return inserted_count, error_count, users_created
+            return self.stats['inserted'], self.stats['failed'], self.stats['users_created']
             
         except Exception as e:
             logger.error(f"✗ Migration failed: {e}")
@@ -720,6 +844,7 @@ def main():
     SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
     DEFAULT_PASSWORD = "@ESCPNetwork2025#"
     DRY_RUN = False  # Set to True for testing without actual inserts
+    COMPANY_MATCH_THRESHOLD = None  # e.g. 0.90 to merge near-duplicate firm names
     
     # We'll use Supabase client instead of direct PostgreSQL connection
     DB_CONFIG = None  # Not needed - we'll use Supabase client
@@ -736,7 +861,8 @@ def main():
         supabase_url=SUPABASE_URL,
         service_role_key=SUPABASE_SERVICE_ROLE_KEY,
         default_password=DEFAULT_PASSWORD,
-        dry_run=DRY_RUN
+        dry_run=DRY_RUN,
+        company_match_threshold=COMPANY_MATCH_THRESHOLD
     )
     
     # Run migration
@@ -10,6 +10,8 @@ from supabase import create_client, Client
 import os
 from typing import Dict, List, Any
 
+from auth_directory import AuthUserDirectory
+
 # Supabase configuration
 SUPABASE_URL = "your-supabase-url"
 SUPABASE_KEY = "your-supabase-anon-key"
@@ -21,11 +23,7 @@ def create_supabase_client() -> Client:
 def get_user_id_by_email(supabase: Client, email: str) -> str:
     """Get user ID by email"""
     try:
-        result = supabase.auth.admin.list_users()
-        for user in result:
-            if user.email == email:
-                return user.id
-        return None
+        return AuthUserDirectory.for_client(supabase).get(email)
     except Exception as e:
         print(f"Error getting user ID for {email}: {e}")
         return None
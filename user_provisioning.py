@@ -0,0 +1,195 @@
+"""
+SHARED SUPABASE USER PROVISIONING
+Creates auth users through the Supabase Admin API with a bounded worker pool,
+a token-bucket rate limiter and retry with backoff on 429/5xx responses.
+
+Used by FINAL_IMPORT.py, create_user_accounts.py, import_surveys_final.py,
+excel_import_surveys.py and supabase/migrations/amigrate.py instead of
+creating users one at a time with hard-coded sleeps.
+
+Usage:
+    provisioner = UserProvisioner(SUPABASE_URL, SERVICE_ROLE_KEY)
+    results = provisioner.provision([
+        {'email': 'a@example.org', 'password': '...', 'user_metadata': {...}},
+    ])
+    # results: email -> {'email', 'status', 'user_id', 'error'}
+    # status is one of 'created', 'existing', 'failed'
+"""
+
+import os
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+import certifi
+import requests
+
+logger = logging.getLogger(__name__)
+
+STATUS_CREATED = 'created'
+STATUS_EXISTING = 'existing'
+STATUS_FAILED = 'failed'
+
+# GoTrue error codes / messages meaning the email already has an account
+EXISTING_USER_ERROR_CODES = ('email_exists', 'user_already_exists')
+EXISTING_USER_MESSAGES = ('already been registered', 'already registered', 'already exists')
+
+
+def is_existing_user_error(response: requests.Response) -> bool:
+    """True if GoTrue rejected a create because the email is taken (not weak_password etc.)"""
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    if not isinstance(body, dict):
+        return False
+    if body.get('error_code') in EXISTING_USER_ERROR_CODES:
+        return True
+    message = str(body.get('msg') or body.get('message') or body.get('error_description') or '').lower()
+    return any(text in message for text in EXISTING_USER_MESSAGES)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until one token is available and take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class UserProvisioner:
+    """Creates Supabase auth users concurrently and reports a per-email outcome"""
+
+    # Responses worth retrying: rate limited or transient server errors
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, supabase_url: str, service_role_key: str,
+                 max_workers: Optional[int] = None, rate_per_second: Optional[float] = None,
+                 max_retries: int = 5, backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.auth_url = f"{supabase_url.rstrip('/')}/auth/v1/admin/users"
+        self.headers = {
+            "apikey": service_role_key,
+            "Authorization": f"Bearer {service_role_key}",
+            "Content-Type": "application/json"
+        }
+        self.max_workers = max_workers or int(os.getenv('PROVISION_WORKERS', '8'))
+        self.bucket = TokenBucket(rate_per_second or float(os.getenv('PROVISION_RATE', '10')))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        """One HTTP session per worker thread (keep-alive, SSL via certifi)"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.verify = certifi.where()
+            self._local.session = session
+        return session
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Delay before the next attempt: Retry-After if given, else capped exponential with jitter"""
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def create_user(self, email: str, password: Optional[str] = None,
+                    user_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Create one confirmed user, retrying on 429/5xx and connection errors"""
+        payload: Dict[str, Any] = {
+            "email": email,
+            "email_confirm": True,
+            "user_metadata": user_metadata or {}
+        }
+        if password:
+            payload["password"] = password
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                response = self._session().post(self.auth_url, headers=self.headers, json=payload, timeout=30)
+            except requests.RequestException as e:
+                error = str(e)
+                if attempt < self.max_retries:
+                    time.sleep(self._backoff(attempt))
+                    continue
+                break
+
+            if response.status_code in (200, 201):
+                return {'email': email, 'status': STATUS_CREATED,
+                        'user_id': response.json().get('id'), 'error': None}
+            if is_existing_user_error(response):
+                return {'email': email, 'status': STATUS_EXISTING, 'user_id': None, 'error': None}
+
+            error = f"{response.status_code} - {response.text}"
+            if response.status_code in self.RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                logger.warning(f"  [!] {email}: {response.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            break
+
+        return {'email': email, 'status': STATUS_FAILED, 'user_id': None, 'error': error}
+
+    def provision(self, users: List[Dict[str, Any]],
+                  on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Create many users on the worker pool.
+
+        users: dicts with 'email' and optional 'password' / 'user_metadata'.
+        on_result: optional callback invoked (from the calling thread) per finished email.
+        Returns email -> result dict.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        if not users:
+            return results
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self.create_user, user['email'], user.get('password'), user.get('user_metadata')): user['email']
+                for user in users
+            }
+            for future in as_completed(futures):
+                email = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'email': email, 'status': STATUS_FAILED, 'user_id': None, 'error': str(e)}
+                results[email] = result
+                if on_result:
+                    on_result(result)
+
+        counts = {status: 0 for status in (STATUS_CREATED, STATUS_EXISTING, STATUS_FAILED)}
+        for result in results.values():
+            counts[result['status']] += 1
+        logger.info(
+            f"Provisioned {len(results)} users in {time.monotonic() - started:.1f}s "
+            f"({counts[STATUS_CREATED]} created, {counts[STATUS_EXISTING]} existing, {counts[STATUS_FAILED]} failed)"
+        )
+        return results